@@ -1,4 +1,18 @@
+import importlib
+
 from .node_parser import NodeParser
-from .markdown_parser import MarkdownParser
 from .types import Node, Delimeter, Card, ClozeCard, BasicCard
-from .generator import package
+
+# Importing these loads Markdown, HTML and Anki libraries, so they are only
+# imported when first used.
+LAZY_IMPORTS = {
+    "MarkdownParser": ".markdown_parser",
+    "package": ".generator",
+}
+
+
+def __getattr__(name: str):
+    if name in LAZY_IMPORTS:
+        return getattr(importlib.import_module(LAZY_IMPORTS[name], __name__), name)
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,356 @@
+import functools
+import itertools
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
+import zipfile
+
+import genanki
+from genanki.apkg_col import APKG_COL
+from genanki.apkg_schema import APKG_SCHEMA
+
+# Notes are inserted this many at a time.
+BATCH_SIZE = 1000
+
+# Formats that are already compressed, so deflating them only costs time.
+STORED_EXTENSIONS = [
+    "png",
+    "jpg",
+    "jpeg",
+    "gif",
+    "webp",
+    "avif",
+    "heic",
+    "mp3",
+    "m4a",
+    "ogg",
+    "opus",
+    "flac",
+    "mp4",
+    "webm",
+    "zip",
+    "gz",
+]
+
+# Media is copied into the package this many bytes at a time.
+CHUNK_SIZE = 1 << 20
+
+
+def compress_type(path: Union[str, os.PathLike]) -> int:
+    extension = os.path.splitext(path)[1][1:].lower()
+
+    if extension in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+
+    return zipfile.ZIP_DEFLATED
+
+
+# An entry of a package. Entries are not dated, i.e. they keep the earliest
+# date a zip file can store, instead of the time they are written or the
+# modification time of the file, so the same notes and media give the same
+# package.
+def zip_info(
+    name: str, size: int, compress_type: int = zipfile.ZIP_STORED
+) -> zipfile.ZipInfo:
+    zinfo = zipfile.ZipInfo(name)
+    zinfo.file_size = size
+    zinfo.compress_type = compress_type
+
+    return zinfo
+
+
+# Copies the file at `path` into `outzip` in chunks, so large files are never
+# read into memory at once. Returns the size of the file.
+def copy_to_zip(
+    outzip: zipfile.ZipFile,
+    path: Union[str, os.PathLike],
+    name: str,
+    compress_type: int = zipfile.ZIP_STORED,
+) -> int:
+    zinfo = zip_info(name, os.path.getsize(path), compress_type)
+
+    with open(path, "rb") as src, outzip.open(zinfo, "w") as dest:
+        shutil.copyfileobj(src, dest, CHUNK_SIZE)
+
+    return zinfo.file_size
+
+
+# The indexes of the fields each cloze template refers to, e.g. "Text" in
+# `{{cloze:Text}}`. Found the same way as `genanki.Note`.
+@functools.cache
+def cloze_field_indexes(model: genanki.Model) -> List[int]:
+    qfmt = model.templates[0]["qfmt"]
+    cloze_replacements = set(
+        re.findall(r"{{[^}]*?cloze:(?:[^}]?:)*(.+?)}}", qfmt)
+        + re.findall("<%cloze:(.+?)%>", qfmt)
+    )
+    field_names = [field["name"] for field in model.fields]
+
+    return [
+        field_names.index(name) if name in field_names else -1
+        for name in cloze_replacements
+    ]
+
+
+# Returns the ordinals of the cards of a note, exactly as `genanki.Note.cards`
+# does, but without creating `genanki.Card` objects.
+def card_ords(model: genanki.Model, fields: List[str]) -> Iterable[int]:
+    if model.model_type == model.FRONT_BACK:
+        ords = []
+
+        for card_ord, any_or_all, required_field_ords in model._req:
+            op = {"any": any, "all": all}[any_or_all]
+
+            if op(fields[ord_] for ord_ in required_field_ords):
+                ords.append(card_ord)
+
+        return ords
+
+    if model.model_type == model.CLOZE:
+        ords_set: Set[int] = set()
+
+        for field_index in cloze_field_indexes(model):
+            field_value = fields[field_index] if field_index >= 0 else ""
+            ords_set.update(
+                int(m) - 1
+                for m in re.findall(r"{{c(\d+)::.+?}}", field_value, re.DOTALL)
+                if int(m) > 0
+            )
+
+        return ords_set
+
+    raise ValueError("Expected model_type CLOZE or FRONT_BACK")
+
+
+def batches(notes: Iterable[genanki.Note]) -> Iterator[List[genanki.Note]]:
+    notes = iter(notes)
+
+    while batch := list(itertools.islice(notes, BATCH_SIZE)):
+        yield batch
+
+
+class ApkgWriter:
+    """
+    Writes an `.apkg` file without going through `genanki.Package`.
+
+    The collection is the same as the one genanki writes, with the same IDs
+    for the same timestamp, but the notes and cards are inserted in batches
+    with `executemany` in a single transaction, and `notes` can be any
+    iterable, so they are never all held in memory.
+    """
+
+    def __init__(self, deck_id: int, deck_name: str):
+        self.deck = genanki.Deck(deck_id, deck_name)
+        self.note_count = 0
+        self.media_bytes = 0
+        self.media_seconds = 0.0
+
+    def write_to_file(
+        self,
+        file: Union[str, os.PathLike],
+        notes: Iterable[genanki.Note],
+        media_files: List[Union[str, os.PathLike]],
+        timestamp: Optional[float] = None,
+    ) -> None:
+        if timestamp is None:
+            timestamp = time.time()
+
+        (db_file, db_path) = tempfile.mkstemp()
+        os.close(db_file)
+
+        try:
+            conn = sqlite3.connect(db_path)
+
+            try:
+                self.write_to_db(conn, notes, timestamp)
+            finally:
+                conn.close()
+
+            # The collection compresses well, and the fastest level is enough
+            # for most of the gain.
+            with zipfile.ZipFile(
+                file, "w", zipfile.ZIP_DEFLATED, compresslevel=1
+            ) as outzip:
+                # Opened by name, the entry gets the compression of the zip
+                # file, and is not dated like `zip_info`.
+                with open(db_path, "rb") as src, outzip.open(
+                    "collection.anki2",
+                    "w",
+                    force_zip64=os.path.getsize(db_path) * 1.05 > zipfile.ZIP64_LIMIT,
+                ) as dest:
+                    shutil.copyfileobj(src, dest, CHUNK_SIZE)
+
+                media_json = {
+                    idx: os.path.basename(path) for idx, path in enumerate(media_files)
+                }
+                outzip.writestr(zip_info("media", 0), json.dumps(media_json))
+
+                start = time.perf_counter()
+
+                for idx, path in enumerate(media_files):
+                    self.media_bytes += copy_to_zip(
+                        outzip, path, str(idx), compress_type(path)
+                    )
+
+                self.media_seconds += time.perf_counter() - start
+        finally:
+            os.remove(db_path)
+
+    def write_to_db(
+        self,
+        conn: sqlite3.Connection,
+        notes: Iterable[genanki.Note],
+        timestamp: float,
+    ) -> None:
+        cursor = conn.cursor()
+        cursor.executescript(APKG_SCHEMA)
+        cursor.executescript(APKG_COL)
+
+        # The collection is only copied into the package once it is complete,
+        # so a crash never leaves a half-written collection in use. Skip the
+        # syncs, and keep the journal in memory rather than on disk.
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute("PRAGMA journal_mode = MEMORY")
+
+        # Building the indexes once after inserting every row is faster than
+        # updating them for each row.
+        indexes = cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql NOT NULL"
+        ).fetchall()
+
+        for name, _ in indexes:
+            cursor.execute("DROP INDEX {}".format(name))
+
+        deck_id = self.deck.deck_id
+        id_gen = itertools.count(int(timestamp * 1000))
+        mod = int(timestamp)
+        # Models in the order they are first used, as genanki adds them.
+        models: Dict[int, genanki.Model] = {}
+
+        for batch in batches(notes):
+            note_rows = []
+            card_rows = []
+
+            for note in batch:
+                model = note.model
+                fields = note.fields
+
+                if len(model.fields) != len(fields):
+                    raise ValueError(
+                        "Number of fields in Model does not match number of "
+                        "fields in Note: {} has {} fields, but {} has {} "
+                        "fields.".format(model, len(model.fields), note, len(fields))
+                    )
+
+                models.setdefault(model.model_id, model)
+
+                note_id = next(id_gen)
+                note_rows.append(
+                    (
+                        note_id,
+                        note.guid,
+                        model.model_id,
+                        mod,
+                        -1,
+                        " " + " ".join(note.tags) + " ",
+                        "\x1f".join(fields),
+                        note.sort_field,
+                        0,
+                        0,
+                        "",
+                    )
+                )
+
+                for card_ord in card_ords(model, fields):
+                    card_rows.append(
+                        (next(id_gen), note_id, deck_id, card_ord, mod, -1)
+                        + (0, 0, note.due, 0, 0, 0, 0, 0, 0, 0, 0, "")
+                    )
+
+            cursor.executemany(
+                "INSERT INTO notes VALUES(?,?,?,?,?,?,?,?,?,?,?)", note_rows
+            )
+            cursor.executemany(
+                "INSERT INTO cards VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                card_rows,
+            )
+            self.note_count += len(batch)
+
+        (decks_json,) = cursor.execute("SELECT decks FROM col").fetchone()
+        decks = json.loads(decks_json)
+        decks.update({str(deck_id): self.deck.to_json()})
+        cursor.execute("UPDATE col SET decks = ?", (json.dumps(decks),))
+
+        (models_json,) = cursor.execute("SELECT models FROM col").fetchone()
+        all_models = json.loads(models_json)
+        all_models.update(
+            {
+                model_id: model.to_json(timestamp, deck_id)
+                for model_id, model in models.items()
+            }
+        )
+        cursor.execute("UPDATE col SET models = ?", (json.dumps(all_models),))
+
+        for _, sql in indexes:
+            cursor.execute(sql)
+
+        conn.commit()
+
+
+# Writes `package`, which has a single deck, like `package.write_to_file`.
+def write_package(
+    package: genanki.Package,
+    file: Union[str, os.PathLike],
+    timestamp: Optional[float] = None,
+) -> ApkgWriter:
+    deck = package.decks[0]
+    writer = ApkgWriter(deck.deck_id, deck.name)
+
+    writer.write_to_file(file, deck.notes, package.media_files, timestamp=timestamp)
+
+    return writer
+
+
+# Writes `package` with genanki, like `package.write_to_file`, but without
+# dating the entries of the zip file, so the same package and timestamp give
+# the same file. Everything is stored uncompressed, like genanki does.
+def write_genanki_package(
+    package: genanki.Package,
+    file: Union[str, os.PathLike],
+    timestamp: Optional[float] = None,
+) -> None:
+    if timestamp is None:
+        timestamp = time.time()
+
+    (db_file, db_path) = tempfile.mkstemp()
+    os.close(db_file)
+
+    try:
+        conn = sqlite3.connect(db_path)
+
+        try:
+            package.write_to_db(
+                conn.cursor(), timestamp, itertools.count(int(timestamp * 1000))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        with zipfile.ZipFile(file, "w") as outzip:
+            copy_to_zip(outzip, db_path, "collection.anki2")
+
+            media_json = {
+                idx: os.path.basename(path)
+                for idx, path in enumerate(package.media_files)
+            }
+            outzip.writestr(zip_info("media", 0), json.dumps(media_json))
+
+            for idx, path in enumerate(package.media_files):
+                copy_to_zip(outzip, path, str(idx))
+    finally:
+        os.remove(db_path)
@@ -0,0 +1,139 @@
+from dataclasses import asdict
+import hashlib
+from importlib import metadata
+import json
+import os
+import pathlib
+from typing import Dict, List, Optional, Set, Tuple
+
+from .types import BasicCard, Card, ClozeCard, Path
+
+CACHE_DIR = pathlib.Path(".ankivalenz") / "cache"
+
+
+def ankivalenz_version() -> str:
+    try:
+        return metadata.version("ankivalenz")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def card_to_json(card: Card) -> dict:
+    if isinstance(card, BasicCard):
+        return {"type": "basic", **asdict(card)}
+    return {"type": "cloze", **asdict(card)}
+
+
+# Equal paths in `paths` are shared between cards, like `NodeParser` does.
+def card_from_json(data: dict, paths: Optional[Dict[Path, Path]] = None) -> Card:
+    data = dict(data)
+    path = tuple(data.pop("path"))
+
+    if paths is not None:
+        path = paths.setdefault(path, path)
+
+    if data.pop("type") == "basic":
+        return BasicCard(path=path, **data)
+    return ClozeCard(path=path, **data)
+
+
+class Cache:
+    """
+    On-disk cache of parsed source files.
+
+    Entries are keyed by a hash of the file contents and format, the
+    Ankivalenz version and the settings that change how files are parsed, so
+    an entry is never reused once any of them changes. Entries are also kept in memory, so a cache
+    that is reused between builds only reads each entry from disk once.
+    """
+
+    # With `in_memory=False`, entries are only read from and written to disk,
+    # so the memory used does not grow with the size of the vault.
+    def __init__(self, path: pathlib.Path, settings: dict, in_memory: bool = True):
+        # Imported here, as the generator imports the cache.
+        from .generator import parser_options
+
+        self.path = path / CACHE_DIR
+        self.in_memory = in_memory
+        # Other settings, e.g. the deck name, do not change the cards of a
+        # file, so changing them keeps the cache.
+        self.salt = json.dumps(
+            {
+                "version": ankivalenz_version(),
+                "options": parser_options(settings),
+                "split_size": settings.get("split_size"),
+            },
+            sort_keys=True,
+        )
+        self.used: Set[str] = set()
+        self.entries: Dict[str, dict] = {}
+
+    # `format` is the format of the file, see `ankivalenz.parsers`.
+    def key(self, text: str, format: str = "markdown") -> str:
+        digest = hashlib.sha256(self.salt.encode())
+        digest.update(b"\0")
+        digest.update(format.encode())
+        digest.update(b"\0")
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[List[Card], List[str]]]:
+        if key in self.entries:
+            data = self.entries[key]
+        else:
+            try:
+                with (self.path / "{}.json".format(key)).open() as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return None
+
+            if self.in_memory:
+                self.entries[key] = data
+
+        self.used.add(key)
+
+        # Cards are created from the stored data on every call, as callers
+        # replace them, e.g. to set their source.
+        paths: Dict[Path, Path] = {}
+
+        return (
+            [card_from_json(c, paths) for c in data["cards"]],
+            data["image_paths"],
+        )
+
+    def set(self, key: str, cards: List[Card], image_paths: List[str]) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.used.add(key)
+
+        data = {
+            "cards": [card_to_json(c) for c in cards],
+            "image_paths": image_paths,
+        }
+
+        if self.in_memory:
+            self.entries[key] = data
+
+        entry_path = self.path / "{}.json".format(key)
+        tmp_path = entry_path.with_suffix(".tmp")
+
+        with tmp_path.open("w") as f:
+            json.dump(data, f)
+
+        # Replace atomically, so an interrupted build never leaves a
+        # half-written entry behind.
+        os.replace(tmp_path, entry_path)
+
+    # Remove entries that were not used by this build, e.g. entries for files
+    # that have since changed or been deleted, and start tracking the next
+    # build.
+    def prune(self) -> None:
+        self.entries = {
+            key: data for key, data in self.entries.items() if key in self.used
+        }
+
+        if self.path.is_dir():
+            for entry_path in self.path.iterdir():
+                if entry_path.stem not in self.used:
+                    entry_path.unlink()
+
+        self.used = set()
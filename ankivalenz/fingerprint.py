@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import pathlib
+from typing import Dict, Iterable, List, Optional, Union
+
+from .cache import ankivalenz_version
+
+FINGERPRINT_PATH = pathlib.Path(".ankivalenz") / "fingerprint.json"
+
+# The modification time in nanoseconds and size of files, by path, or `None`
+# for files that do not exist.
+Stats = Dict[str, Optional[List[int]]]
+
+
+def stat_files(paths: Iterable[Union[str, os.PathLike]]) -> Stats:
+    stats: Stats = {}
+
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stats[str(path)] = None
+        else:
+            stats[str(path)] = [stat.st_mtime_ns, stat.st_size]
+
+    return stats
+
+
+# Hash of the inputs of a build: the Ankivalenz version, the settings, the
+# options that change the package, and the files that were read and written.
+# Files are compared by modification time and size, like `ankivalenz watch`.
+def input_digest(settings: dict, options: dict, stats: Stats) -> str:
+    data = json.dumps(
+        {
+            "version": ankivalenz_version(),
+            "settings": settings,
+            "options": options,
+            "files": stats,
+        },
+        sort_keys=True,
+    )
+
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+# The latest modification time of the files in `stats`, in whole seconds. Used
+# as the time of the notes in a package, so the same files give the same
+# package, while a package built after changing a file has newer notes, which
+# Anki needs to update them on import.
+def latest_mtime(stats: Stats) -> int:
+    return max((stat[0] for stat in stats.values() if stat), default=0) // 10**9
+
+
+class Fingerprint:
+    """
+    The input digest of the last build, and the media it used. The media of a
+    build is only known after parsing, but as long as no files have changed,
+    neither has the media, so the media of the last build is checked instead.
+    """
+
+    def __init__(self, digest: Optional[str] = None, media: Optional[List[str]] = None):
+        self.digest = digest
+        self.media: List[str] = media or []
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "Fingerprint":
+        try:
+            with (path / FINGERPRINT_PATH).open() as f:
+                data = json.load(f)
+
+            return cls(data["digest"], data["media"])
+        except (OSError, ValueError, KeyError):
+            return cls()
+
+    def save(self, path: pathlib.Path) -> None:
+        fingerprint_path = path / FINGERPRINT_PATH
+        fingerprint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = fingerprint_path.with_suffix(".tmp")
+
+        with tmp_path.open("w") as f:
+            json.dump({"digest": self.digest, "media": self.media}, f, indent=2)
+
+        # Replace atomically, like the manifest.
+        os.replace(tmp_path, fingerprint_path)
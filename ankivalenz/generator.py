@@ -1,76 +1,439 @@
-from datetime import datetime
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import replace
+import functools
+import itertools
+from html import unescape
 import json
 import os
 import pathlib
 import random
-from typing import List, Optional, Tuple
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 from ankivalenz.markdown_parser import MarkdownParser
 from ankivalenz.node_parser import NodeParser
+from ankivalenz.parsers import create_parser, file_format
 from .anki_models import BASIC_AND_REVERSED_CARD_MODEL, BASIC_MODEL, CLOZE_MODEL
+from .cache import Cache
+from .manifest import Manifest, note_tag
+from .spill import CardStore, SpilledManifest
+from .splitter import split_text
+from .timings import Timings
 from .types import BasicCard, Card, ClozeCard, Path
+from .walker import IGNORE_FILE, Ignore, find_files
 import genanki
+from urllib.parse import unquote
 
 
 class Note(genanki.Note):
-    pass
+    # `source` is the path of the file the note was found in.
+    def __init__(self, *args, source: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.source = source
 
 
 def format_path(path: Path) -> str:
     return " > ".join(path)
 
 
-def cards_to_notes(cards: List[Card], time: Optional[datetime]) -> List[Note]:
-    if time is None:
-        time = datetime.now()
+# Notes are identified by their explicit ID if they have one, and otherwise
+# by their file, path and question. Editing the answer of a note then updates
+# the note in Anki, instead of adding a new one.
+def card_guid(card: Card) -> str:
+    if card.id is not None:
+        return genanki.guid_for(card.id)
 
-    notes = []
+    return genanki.guid_for(card.source or "", format_path(card.path), card.question)
 
-    ts = time.timestamp()
-    ts_int = int(ts)
 
-    updated_tag = "ankivalenz:updated:{}".format(ts_int)
+def iter_notes(
+    cards: Iterable[Card], timings: Optional[Timings] = None
+) -> Iterator[Note]:
+    if timings is None:
+        timings = Timings()
+
+    guid_counts: Dict[str, int] = {}
 
     for card in cards:
-        if isinstance(card, BasicCard):
-            note = Note(
-                model=BASIC_AND_REVERSED_CARD_MODEL if card.reverse else BASIC_MODEL,
-                fields=[card.question, card.answer, format_path(card.path)],
-                # Add tag `ankivalenz:updated:<time in epoch>` to note.
-                tags=[updated_tag],
-            )
-            notes.append(note)
-        if isinstance(card, ClozeCard):
-            note = Note(
-                model=CLOZE_MODEL,
-                fields=[card.question, "", format_path(card.path)],
-                tags=[updated_tag],
+        with timings.stage("notes"):
+            guid = card_guid(card)
+
+            count = guid_counts.get(guid, 0)
+            guid_counts[guid] = count + 1
+
+            note = card_note(card, guid, count)
+
+        yield note
+
+
+# The note of `card`, whose GUID is `guid`, and which comes after `count`
+# cards with the same GUID.
+def card_note(card: Card, guid: str, count: int) -> Note:
+    # Tell apart identical cards in the same file and path.
+    if count > 0:
+        guid = genanki.guid_for(guid, count)
+
+    if isinstance(card, BasicCard):
+        return Note(
+            model=BASIC_AND_REVERSED_CARD_MODEL if card.reverse else BASIC_MODEL,
+            fields=[card.question, card.answer, format_path(card.path)],
+            # Only add tags that stay the same between builds, so unchanged
+            # notes stay unchanged.
+            tags=[note_tag(guid)],
+            guid=guid,
+            source=card.source,
+        )
+
+    return Note(
+        model=CLOZE_MODEL,
+        fields=[card.question, "", format_path(card.path)],
+        tags=[note_tag(guid)],
+        guid=guid,
+        source=card.source,
+    )
+
+
+class SpilledNotes:
+    """
+    The notes of the cards in a `CardStore`, created as they are iterated, so
+    a package can be written without holding every note in memory. Used as
+    the notes of a deck, and like a list, it can be iterated more than once.
+    """
+
+    def __init__(self, store: CardStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __iter__(self) -> Iterator[Note]:
+        for card, guid, count in self.store:
+            yield card_note(card, guid, count)
+
+
+def cards_to_notes(cards: List[Card]) -> List[Note]:
+    return list(iter_notes(cards))
+
+
+# Settings in `ankivalenz.json` that are passed on to `MarkdownParser`.
+PARSER_SETTINGS = ["parser", "html_backend", "delimiters"]
+
+
+def parser_options(settings: dict) -> dict:
+    return {key: settings[key] for key in PARSER_SETTINGS if key in settings}
+
+
+# Parses `parts`, which are (format, prefix, text) triples, where `prefix` and
+# `text` are as returned by `split_text`. Each format is parsed by its parser,
+# see `ankivalenz.parsers`.
+def parse_chunk(
+    parts: List[Tuple[str, str, str]], options: Optional[dict] = None
+) -> Tuple[List[Tuple[List[Card], List[str]]], Timings]:
+    timings = Timings()
+    parsers = {}
+    node_parser = NodeParser()
+    entries = []
+
+    # Runs of parts with the same format are parsed together, in order, so
+    # the parse times are in the order of the parts.
+    for format, run in itertools.groupby(parts, key=lambda part: part[0]):
+        run_parts = list(run)
+
+        if format not in parsers:
+            parsers[format] = create_parser(format, options, timings)
+
+        results = parsers[format].parse_many(
+            prefix + text for (_, prefix, text) in run_parts
+        )
+
+        for (_, prefix, _), (nodes, image_paths) in zip(run_parts, results):
+            # Images in the headings of the prefix belong to an earlier part.
+            image_paths = image_paths[prefix_image_count(prefix, options) :]
+
+            with timings.stage("nodes"):
+                entries.append((node_parser.parse(nodes), image_paths))
+
+    return (entries, timings)
+
+
+# The number of images in the headings of `prefix`. Headings rarely have
+# images, so the prefix is only parsed if it may have any, and without timing
+# it.
+def prefix_image_count(prefix: str, options: Optional[dict] = None) -> int:
+    if "![" not in prefix and "<img" not in prefix.lower():
+        return 0
+
+    return len(MarkdownParser(**(options or {})).parse(prefix)[1])
+
+
+# Parses `texts`, and returns the cards and image paths of each. `formats` is
+# the format of each text, e.g. "html", and Markdown by default. Markdown texts
+# larger than `split_size` are split at headings and parsed in parts, which
+# can be parsed in parallel, see `split_text`.
+def parse_texts(
+    texts: List[str],
+    jobs: int = 1,
+    options: Optional[dict] = None,
+    timings: Optional[Timings] = None,
+    executor: Optional[Executor] = None,
+    split_size: Optional[int] = None,
+    formats: Optional[List[str]] = None,
+) -> List[Tuple[List[Card], List[str]]]:
+    if timings is None:
+        timings = Timings()
+
+    if formats is None:
+        formats = ["markdown"] * len(texts)
+
+    text_parts = []
+
+    for format, text in zip(formats, texts):
+        if split_size and format == "markdown":
+            split = split_text(text, split_size)
+        else:
+            split = [("", text)]
+
+        text_parts.append([(format, prefix, part) for (prefix, part) in split])
+
+    parse_times = len(timings.parse_times)
+    part_entries = iter(
+        parse_parts(
+            [part for parts in text_parts for part in parts],
+            jobs,
+            options,
+            timings,
+            executor,
+        )
+    )
+    part_times = iter(timings.parse_times[parse_times:])
+    entries = []
+    times = []
+
+    # The parts of a text are in order, so joining their cards gives the
+    # cards of the whole text.
+    for parts in text_parts:
+        cards: List[Card] = []
+        image_paths: List[str] = []
+
+        for part_cards, part_image_paths in itertools.islice(part_entries, len(parts)):
+            cards.extend(part_cards)
+            image_paths.extend(part_image_paths)
+
+        entries.append((cards, image_paths))
+        times.append(sum(itertools.islice(part_times, len(parts))))
+
+    timings.parse_times[parse_times:] = times
+
+    return entries
+
+
+def parse_parts(
+    parts: List[Tuple[str, str, str]],
+    jobs: int,
+    options: Optional[dict],
+    timings: Timings,
+    executor: Optional[Executor],
+) -> List[Tuple[List[Card], List[str]]]:
+    if jobs <= 1 or len(parts) <= 1:
+        (entries, chunk_timings) = parse_chunk(parts, options)
+        timings.merge(chunk_timings)
+
+        return entries
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return parse_parts(parts, jobs, options, timings, executor)
+
+    # Parsing is CPU-bound, so fan out to processes rather than threads.
+    # Each process parses its chunks with a single MarkdownParser, and `map`
+    # returns the chunks in the order of `parts`.
+    size = max(1, len(parts) // (jobs * 4))
+    chunks = [parts[idx : idx + size] for idx in range(0, len(parts), size)]
+    entries = []
+
+    for chunk_entries, chunk_timings in executor.map(
+        functools.partial(parse_chunk, options=options), chunks
+    ):
+        entries.extend(chunk_entries)
+        timings.merge(chunk_timings)
+
+    return entries
+
+
+# Number of files read and parsed at a time by each job. Only this many files
+# are held in memory at once.
+FILES_PER_JOB = 16
+
+
+# Yields the cards and image paths of each file in `path`, in order. Files are
+# read and parsed in batches, so memory use depends on the size of a batch of
+# files rather than the whole vault. `extension` is a file extension or a list
+# of them, and files and folders matched by `ignore` are left out.
+def iter_files(
+    path: pathlib.Path,
+    extension: Union[str, List[str]] = "md",
+    cache: Optional[Cache] = None,
+    jobs: int = 1,
+    options: Optional[dict] = None,
+    timings: Optional[Timings] = None,
+    split_size: Optional[int] = None,
+    ignore: Optional[Ignore] = None,
+) -> Iterator[Tuple[List[Card], List[pathlib.Path]]]:
+    if timings is None:
+        timings = Timings()
+
+    # Sort the files, so the cards are in the same order regardless of the
+    # file system and the number of jobs.
+    with timings.stage("glob"):
+        file_paths = find_files(path, input_extensions(extension), ignore)
+
+    timings.count("files", len(file_paths))
+
+    if jobs <= 1:
+        # One file at a time.
+        yield from iter_batches(
+            path,
+            file_paths,
+            1,
+            cache,
+            jobs,
+            options,
+            timings,
+            split_size=split_size,
+        )
+        return
+
+    # Keep one pool of processes for all batches.
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from iter_batches(
+            path,
+            file_paths,
+            jobs * FILES_PER_JOB,
+            cache,
+            jobs,
+            options,
+            timings,
+            executor,
+            split_size,
+        )
+
+
+def iter_batches(
+    path: pathlib.Path,
+    file_paths: List[pathlib.Path],
+    batch_size: int,
+    cache: Optional[Cache],
+    jobs: int,
+    options: Optional[dict],
+    timings: Timings,
+    executor: Optional[Executor] = None,
+    split_size: Optional[int] = None,
+) -> Iterator[Tuple[List[Card], List[pathlib.Path]]]:
+    for batch_start in range(0, len(file_paths), batch_size):
+        batch = file_paths[batch_start : batch_start + batch_size]
+        texts = []
+
+        with timings.stage("read"):
+            for file_path in batch:
+                with file_path.open() as f:
+                    texts.append(f.read())
+
+        sources = [file_path.relative_to(path).as_posix() for file_path in batch]
+        formats = [file_format(file_path) for file_path in batch]
+
+        if cache is None:
+            misses = list(range(len(texts)))
+            entries: List[Optional[Tuple[List[Card], List[str]]]] = [None] * len(texts)
+        else:
+            with timings.stage("cache"):
+                keys = [
+                    cache.key(text, format) for (text, format) in zip(texts, formats)
+                ]
+                entries = [cache.get(key) for key in keys]
+                misses = [idx for idx, entry in enumerate(entries) if entry is None]
+
+        parse_times = len(timings.parse_times)
+
+        with timings.stage("parse"):
+            parsed = parse_texts(
+                [texts[idx] for idx in misses],
+                jobs=jobs,
+                options=options,
+                timings=timings,
+                executor=executor,
+                split_size=split_size,
+                formats=[formats[idx] for idx in misses],
             )
-            notes.append(note)
 
-    return notes
+        for idx, seconds in zip(misses, timings.parse_times[parse_times:]):
+            timings.files[sources[idx]] = seconds
 
+        for idx, entry in zip(misses, parsed):
+            entries[idx] = entry
 
-def load_cards(
-    path: pathlib.Path, extension: str = "md"
-) -> Tuple[List[Card], List[str]]:
-    cards = []
-    image_paths = []
+        if cache is not None:
+            with timings.stage("cache"):
+                for idx, entry in zip(misses, parsed):
+                    cache.set(keys[idx], *entry)
+
+        timings.count("parsed files", len(misses))
+
+        for file_path, source, file_entry in zip(batch, sources, entries):
+            # Every file is either cached or parsed by now.
+            assert file_entry is not None
+            (file_cards, ips) = file_entry
+            image_paths = []
 
-    for file_path in path.glob("**/*.{}".format(extension)):
-        with file_path.open() as f:
-            (nodes, ips) = MarkdownParser().parse(f.read())
-            cards.extend(NodeParser().parse(nodes))
+            file_cards = [replace(card, source=source) for card in file_cards]
 
             for ip in ips:
                 # Resolve e.g. "a/../b" to "b"
-                ip = (
+                image_paths.append(
                     file_path.parent.joinpath(ip)
                     .resolve()
                     .relative_to(pathlib.Path.cwd())
                 )
 
-                image_paths.append(ip)
+            timings.count("cards", len(file_cards))
+
+            yield (file_cards, image_paths)
+
+
+# Yields the cards of each file in `path`, in order. See `iter_files`.
+def iter_cards(
+    path: pathlib.Path,
+    extension: Union[str, List[str]] = "md",
+    cache: Optional[Cache] = None,
+    jobs: int = 1,
+    options: Optional[dict] = None,
+    timings: Optional[Timings] = None,
+    split_size: Optional[int] = None,
+    ignore: Optional[Ignore] = None,
+) -> Iterator[Card]:
+    for file_cards, _ in iter_files(
+        path, extension, cache, jobs, options, timings, split_size, ignore
+    ):
+        yield from file_cards
+
+
+def load_cards(
+    path: pathlib.Path,
+    extension: Union[str, List[str]] = "md",
+    cache: Optional[Cache] = None,
+    jobs: int = 1,
+    options: Optional[dict] = None,
+    timings: Optional[Timings] = None,
+    split_size: Optional[int] = None,
+    ignore: Optional[Ignore] = None,
+) -> Tuple[List[Card], List[pathlib.Path]]:
+    cards = []
+    image_paths = []
+
+    for file_cards, file_image_paths in iter_files(
+        path, extension, cache, jobs, options, timings, split_size, ignore
+    ):
+        cards.extend(file_cards)
+        image_paths.extend(file_image_paths)
 
     return (cards, image_paths)
 
@@ -92,26 +455,144 @@ def init(path: pathlib.Path) -> str:
     return json_path
 
 
-def package(path: pathlib.Path, time: Optional[datetime] = None) -> genanki.Package:
+def load_settings(path: pathlib.Path, html_backend: Optional[str] = None) -> dict:
     with open(os.path.join(path, "ankivalenz.json")) as f:
         settings = json.load(f)
 
+    if html_backend is not None:
+        settings["html_backend"] = html_backend
+
+    return settings
+
+
+# `input_ext` is a file extension, e.g. "md", or a list of them.
+def input_extensions(input_ext: Union[str, List[str]]) -> List[str]:
+    if isinstance(input_ext, str):
+        return [input_ext]
+
+    return list(input_ext)
+
+
+# The files a build of `path` reads, other than media: the settings, the ignore
+# file and the input files. Missing files are included, as adding them changes
+# the build.
+def source_files(path: pathlib.Path, settings: dict) -> List[pathlib.Path]:
+    input_files = find_files(
+        path / settings.get("input_path", ""),
+        input_extensions(settings.get("input_ext", "md")),
+        Ignore.load(path, settings.get("exclude", [])),
+    )
+
+    return [path / "ankivalenz.json", path / IGNORE_FILE, *input_files]
+
+
+# `cache` is either a flag, or a `Cache` that is kept between builds, e.g. by
+# `ankivalenz watch`. If `manifest` is given, every note is added to it. If
+# `store` is given, the cards are spilled to it, and the notes of the deck are
+# created from it as they are written, see `SpilledNotes`.
+def package(
+    path: pathlib.Path,
+    cache: Union[bool, Cache] = False,
+    jobs: int = 1,
+    html_backend: Optional[str] = None,
+    timings: Optional[Timings] = None,
+    manifest: Optional[Union[Manifest, SpilledManifest]] = None,
+    store: Optional[CardStore] = None,
+) -> genanki.Package:
+    if timings is None:
+        timings = Timings()
+
+    settings = load_settings(path, html_backend=html_backend)
+
     input_path = path / settings.get("input_path", "")
-    input_ext = settings.get("input_ext", "md")
 
-    (cards, image_paths) = load_cards(input_path, extension=input_ext)
+    if isinstance(cache, Cache):
+        card_cache: Optional[Cache] = cache
+    else:
+        # Only keep cache entries in memory if the cards are.
+        card_cache = Cache(path, settings, in_memory=store is None) if cache else None
 
     deck = genanki.Deck(
         settings["deck_id"],
         settings["deck_name"],
     )
 
-    for note in cards_to_notes(cards, time=time):
-        deck.add_note(note)
+    image_paths: Set[pathlib.Path] = set()
+
+    # Stream each file's cards straight into notes, collecting the image
+    # paths on the way, so no list of every card in the vault is built.
+    def cards() -> Iterator[Card]:
+        for file_cards, file_image_paths in iter_files(
+            input_path,
+            extension=input_extensions(settings.get("input_ext", "md")),
+            cache=card_cache,
+            jobs=jobs,
+            options=parser_options(settings),
+            timings=timings,
+            split_size=settings.get("split_size"),
+            ignore=Ignore.load(path, settings.get("exclude", [])),
+        ):
+            image_paths.update(file_image_paths)
+            yield from file_cards
+
+    if store is None:
+        for note in iter_notes(cards(), timings=timings):
+            deck.add_note(note)
+
+            if manifest is not None:
+                manifest.add(note, note.source)
+    else:
+        with timings.stage("spill"):
+            store.add((card, card_guid(card)) for card in cards())
+
+        deck.notes = SpilledNotes(store)
+
+        if manifest is not None:
+            for note in deck.notes:
+                manifest.add(note, note.source)
+
+    if card_cache is not None:
+        card_cache.prune()
 
     package = genanki.Package(deck)
 
-    for image_path in list(set(image_paths)):
+    # Sorted, so the media is in the same order in every build.
+    for image_path in sorted(image_paths):
         package.media_files.append(image_path)
 
+    timings.count("notes", len(deck.notes))
+    timings.count("media", len(package.media_files))
+
     return package
+
+
+SRC_REGEXP = re.compile(r'src="([^"]*)"')
+
+
+# The names of the media files referenced by `notes`. Image paths are
+# stripped to their file names when parsing, see `HtmlParser`.
+def referenced_media(notes: Iterable[genanki.Note]) -> Set[str]:
+    return {
+        unquote(unescape(name))
+        for note in notes
+        for field in note.fields
+        for name in SRC_REGEXP.findall(field)
+    }
+
+
+# Returns a package with only the notes of `package` with `guids`, and only
+# the media files they reference.
+def delta_package(package: genanki.Package, guids: Set[str]) -> genanki.Package:
+    deck = package.decks[0]
+    delta_deck = genanki.Deck(deck.deck_id, deck.name)
+
+    for note in deck.notes:
+        if note.guid in guids:
+            delta_deck.add_note(note)
+
+    names = referenced_media(delta_deck.notes)
+
+    return genanki.Package(
+        delta_deck,
+        media_files=[p for p in package.media_files if os.path.basename(p) in names],
+    )
@@ -1,15 +1,41 @@
+import functools
 import itertools
-import re
-from typing import List, Tuple
-from bs4 import BeautifulSoup, NavigableString, PageElement, Tag
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import warnings
+from bs4 import BeautifulSoup, FeatureNotFound, NavigableString, PageElement, Tag
+from bs4.formatter import HTMLFormatter
 from urllib.parse import unquote
 
-from .types import ClozeNode, Delimeter, Node
+from .lexer import BASIC, CLOZE, STANDALONE, get_lexer
+from .types import BasicNode, Node, PathNode, StandaloneNode
 
-BASIC_REGEXP = r"(.*?)\s*(::\?|\?::|::)\s*(.*)"
-STANDALONE_REGEXP = r"^(::\?|\?::|::)\s*(.*)"
-CLOZE_REGEXP = r".*{{c\d+::.*"
 HEADER_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
+HTML_BACKENDS = ["html.parser", "lxml", "html5lib"]
+
+# The formatter BeautifulSoup uses for `str` on HTML documents.
+FORMATTER = HTMLFormatter.REGISTRY["minimal"]
+
+
+# Returns `backend` if it is installed, and otherwise falls back to
+# BeautifulSoup's built-in "html.parser".
+@functools.cache
+def available_backend(backend: str) -> str:
+    if backend not in HTML_BACKENDS:
+        raise ValueError(
+            "Unknown HTML backend {!r}, expected one of: {}".format(
+                backend, ", ".join(HTML_BACKENDS)
+            )
+        )
+
+    try:
+        BeautifulSoup("", backend)
+    except FeatureNotFound:
+        warnings.warn(
+            "HTML backend {!r} is not installed, using html.parser".format(backend)
+        )
+        return "html.parser"
+
+    return backend
 
 
 # Returns `True` if `element` is a non-header or a header with
@@ -25,51 +51,203 @@ def is_descendant(header: str, element: PageElement) -> bool:
     return element.name > header
 
 
+# Returns the index just past the section of each header in `elements`, i.e.
+# the index of the next header with the same or a higher priority, or the end
+# of `elements`. Computed in a single pass with a stack of open sections.
+def section_ends(elements: List[PageElement]) -> Dict[int, int]:
+    ends: Dict[int, int] = {}
+    # The index and name of each open header.
+    open_headers: List[Tuple[int, str]] = []
+
+    for idx, element in enumerate(elements):
+        if isinstance(element, Tag) and element.name in HEADER_TAGS:
+            while open_headers and not is_descendant(open_headers[-1][1], element):
+                ends[open_headers.pop()[0]] = idx
+
+            open_headers.append((idx, element.name))
+
+    for idx, _ in open_headers:
+        ends[idx] = len(elements)
+
+    return ends
+
+
+# Serializes `elements` exactly like `"".join(map(str, elements))`, in a single
+# pass over the tree. `str` renders each tag with BeautifulSoup's
+# pretty-printing machinery, which is most of the time spent parsing a file;
+# this only formats the tags and strings. Anything that is not a plain tag or
+# string, e.g. a comment or a namespaced tag, is rendered with `str`.
+def serialize(elements: Iterable[PageElement]) -> str:
+    pieces: List[str] = []
+    stack: List[Iterator[PageElement]] = [iter(elements)]
+    closing_tags: List[str] = []
+
+    while stack:
+        element = next(stack[-1], None)
+
+        if element is None:
+            stack.pop()
+
+            if closing_tags:
+                pieces.append(closing_tags.pop())
+        elif len(stack) == 1 and isinstance(element, NavigableString):
+            # `str` of a string is its text, not its markup.
+            pieces.append(str(element))
+        elif type(element) is NavigableString:
+            if "&" in element or "<" in element or ">" in element:
+                # Leaves the strings of <script> and <style> as they are.
+                pieces.append(FORMATTER.substitute(element))
+            else:
+                pieces.append(element)
+        elif type(element) is Tag and (start_tag := format_start_tag(element)):
+            pieces.append(start_tag)
+
+            if not element.is_empty_element:
+                stack.append(iter(element.contents))
+                closing_tags.append("</" + element.name + ">")
+        elif len(stack) == 1:
+            pieces.append(str(element))
+        elif isinstance(element, Tag):
+            pieces.append(element.decode(formatter=FORMATTER))
+        else:
+            # Comments, CDATA and other special strings.
+            assert isinstance(element, NavigableString)
+            pieces.append(element.output_ready(FORMATTER))
+
+    return "".join(pieces)
+
+
+# Formats the start tag of `tag` like BeautifulSoup, or returns `None` if the
+# tag needs more than the minimal formatting.
+def format_start_tag(tag: Tag) -> Optional[str]:
+    if tag.prefix or tag.hidden:
+        return None
+
+    if not tag.attrs:
+        if tag.is_empty_element:
+            return "<" + tag.name + (FORMATTER.void_element_close_prefix or "") + ">"
+
+        return "<" + tag.name + ">"
+
+    attributes = []
+
+    for key, value in FORMATTER.attributes(tag):
+        if value is None:
+            attributes.append(key)
+            continue
+
+        if isinstance(value, (list, tuple)):
+            value = " ".join(value)
+        elif type(value) is not str:
+            return None
+
+        attributes.append(
+            key
+            + "="
+            + FORMATTER.quoted_attribute_value(FORMATTER.attribute_value(value))
+        )
+
+    return "".join(
+        [
+            "<",
+            tag.name,
+            " " if attributes else "",
+            " ".join(attributes),
+            (FORMATTER.void_element_close_prefix or "") if tag.is_empty_element else "",
+            ">",
+        ]
+    )
+
+
 class HtmlParser:
+    def __init__(
+        self,
+        backend: str = "html.parser",
+        delimiters: Optional[Dict[str, str]] = None,
+        ignored_tags: Iterable[str] = (),
+    ):
+        self.backend = available_backend(backend)
+        self.lexer = get_lexer(delimiters)
+        # Tags whose contents are not searched for notes, e.g. <style>.
+        self.ignored_tags = frozenset(ignored_tags)
+
     def parse(self, text: str) -> Tuple[List[Node], List[str]]:
-        soup = BeautifulSoup(text, "html.parser")
+        return self.parse_tree(BeautifulSoup(text, self.backend))
 
+    def parse_tree(self, soup: BeautifulSoup) -> Tuple[List[Node], List[str]]:
         paths = self.strip_image_paths(soup)
 
+        # lxml and html5lib wrap the document in <html> and <body>, so use
+        # the contents of <body> to get the same elements as html.parser.
+        if self.backend != "html.parser" and soup.body is not None:
+            return (self.find_nodes(soup.body.contents), paths)
+
         return (self.find_nodes(soup.contents), paths)
 
-    # recursively traverse the tree, and modify all image srcs to be the basename only:
+    # Traverses the tree, and modifies all image srcs to be the basename
+    # only. Uses a stack of iterators instead of recursion, so deeply nested
+    # documents do not hit the recursion limit.
     def strip_image_paths(self, elements: List[PageElement]) -> List[str]:
         paths = []
+        stack = [iter(elements)]
 
-        for i, e in enumerate(elements):
-            if isinstance(e, Tag):
+        while stack:
+            e = next(stack[-1], None)
+
+            if e is None:
+                stack.pop()
+            elif isinstance(e, Tag):
                 if e.name == "img":
                     paths.append(unquote(e["src"]))
                     e["src"] = e["src"].split("/")[-1]
-                paths.extend(self.strip_image_paths(e.contents))
+                stack.append(iter(e.contents))
 
         return paths
 
     def find_nodes(self, elements: List[PageElement]) -> List[Node]:
         nodes: List[Node] = []
+        stack = [Section(elements, nodes)]
+
+        while stack:
+            self.find_section_nodes(stack)
+
+        return nodes
+
+    # Continues finding the nodes of the section at the top of `stack`, i.e.
+    # in `elements[start:end]`, until it is done and popped, or a nested
+    # section is pushed. A nested section adds its nodes to a list in the
+    # outer section's nodes, or to the outer section's nodes directly, and
+    # the outer section continues where it left off once the nested section
+    # is done. Each header section is nested this way, after which parsing
+    # continues at the end of the section, so sibling sections never copy or
+    # rescan `elements`.
+    def find_section_nodes(self, stack: List["Section"]) -> None:
+        section = stack[-1]
+        elements = section.elements
+        nodes = section.nodes
+
+        while section.idx < section.end:
+            idx = section.idx
+            element = elements[idx]
+            section.idx = idx + 1
 
-        for idx, element in enumerate(elements):
             if isinstance(element, Tag):
-                if element.name in HEADER_TAGS:
-                    header = "".join(map(str, element.contents))
+                if element.name in self.ignored_tags:
+                    continue
+                elif element.name in HEADER_TAGS:
+                    header = serialize(element.contents)
+                    children: List[Node] = []
+                    nodes.append(PathNode(header, children))
 
-                    children = [
-                        *itertools.takewhile(
-                            lambda x: is_descendant(element.name, x),
-                            elements[idx + 1 :],
+                    # Continue with the rest, as if it was a separate list
+                    # of elements.
+                    section.start = section.idx = section.ends[idx]
+                    stack.append(
+                        Section(
+                            elements, children, section.ends, idx + 1, section.ends[idx]
                         )
-                    ]
-                    rest = [
-                        *itertools.dropwhile(
-                            lambda x: is_descendant(element.name, x),
-                            elements[idx + 1 :],
-                        )
-                    ]
-
-                    nodes.append((header, self.find_nodes(children)))
-                    nodes.extend(self.find_nodes(rest))
-                    break
+                    )
+                    return
                 elif element.name == "li":
                     head = [
                         *itertools.takewhile(
@@ -103,7 +281,10 @@ class HtmlParser:
                             #
                             # The string is used as the header.
                             header = str(head[0]).strip()
-                            nodes.append((header, self.find_nodes(tail)))
+                            children = []
+                            nodes.append(PathNode(header, children))
+                            stack.append(Section(tail, children))
+                            return
                         else:
                             # There are one or more tags before the nested list:
                             #
@@ -118,39 +299,71 @@ class HtmlParser:
                             for e in head:
                                 if isinstance(e, Tag):
                                     if e.name == "p":
-                                        header = "".join(map(str, e.contents))
+                                        header = serialize(e.contents)
                                     else:
-                                        header = str(e)
+                                        header = serialize([e])
 
-                                    nodes.append((header, self.find_nodes(tail)))
-                                    break
+                                    children = []
+                                    nodes.append(PathNode(header, children))
+                                    stack.append(Section(tail, children))
+                                    return
                     else:
-                        nodes.extend(self.find_nodes(head))
+                        stack.append(Section(head, nodes))
+                        return
                 else:
-                    nodes.extend(self.find_nodes(element.contents))
+                    stack.append(Section(element.contents, nodes))
+                    return
             elif isinstance(element, NavigableString):
-                if match := re.match(CLOZE_REGEXP, str(element), re.DOTALL):
-                    before = "".join(map(str, elements[:idx]))
-                    after = "".join(map(str, elements[idx + 1 :]))
+                (kind, before_match, delimeter, after_match) = self.lexer.lex(
+                    str(element)
+                )
+                start = section.start
+                end = section.end
+
+                if kind == CLOZE:
+                    before = serialize(elements[start:idx])
+                    after = serialize(elements[idx + 1 : end])
 
                     nodes.append(before.strip() + str(element).strip() + after.strip())
                     break
-                elif match := re.match(STANDALONE_REGEXP, str(element), re.DOTALL):
-                    delimeter_type, after_match = match.groups()
+                elif kind == STANDALONE:
+                    # Standalone and basic texts always have a delimiter.
+                    assert delimeter is not None
+                    after = after_match + serialize(elements[idx + 1 : end])
 
-                    after = after_match + "".join(map(str, elements[idx + 1 :]))
+                    nodes.append(StandaloneNode(delimeter, after.strip()))
+                    break
+                elif kind == BASIC:
+                    assert delimeter is not None
+                    before = serialize(elements[start:idx]) + before_match
+                    after = after_match + serialize(elements[idx + 1 : end])
 
-                    nodes.append((Delimeter(delimeter_type), after.strip()))
+                    nodes.append(BasicNode(before.strip(), delimeter, after.strip()))
                     break
-                elif match := re.match(BASIC_REGEXP, str(element), re.DOTALL):
-                    before_match, delimeter_type, after_match = match.groups()
 
-                    before = "".join(map(str, elements[:idx])) + before_match
-                    after = after_match + "".join(map(str, elements[idx + 1 :]))
+        stack.pop()
 
-                    nodes.append(
-                        (before.strip(), Delimeter(delimeter_type), after.strip())
-                    )
-                    break
 
-        return nodes
+class Section:
+    """
+    Elements whose nodes are being found by `HtmlParser.find_nodes`: the
+    elements in `elements[start:end]`, where the elements before `idx` have
+    been handled. The nodes are added to `nodes`.
+    """
+
+    __slots__ = ["elements", "nodes", "ends", "start", "end", "idx"]
+
+    def __init__(
+        self,
+        elements: List[PageElement],
+        nodes: List[Node],
+        ends: Optional[Dict[int, int]] = None,
+        start: int = 0,
+        end: Optional[int] = None,
+    ):
+        self.elements = elements
+        self.nodes = nodes
+        self.ends = section_ends(elements) if ends is None else ends
+        self.start = start
+        self.end = len(elements) if end is None else end
+        self.idx = start
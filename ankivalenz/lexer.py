@@ -0,0 +1,104 @@
+import functools
+import re
+from typing import Dict, Optional, Tuple
+
+from .types import Delimeter
+
+# The delimiters of each kind of front/back card, as written by default. The
+# configured delimiters are always reported as these, so the rest of
+# Ankivalenz only deals with the defaults.
+DEFAULT_DELIMITERS = {
+    "front_back": "?::",
+    "back_front": "::?",
+    "two_way": "::",
+}
+
+CLOZE_PATTERN = r"\{\{c\d+::"
+
+CLOZE = "cloze"
+STANDALONE = "standalone"
+BASIC = "basic"
+PLAIN = "plain"
+
+# The kind of a text, and for standalone and basic texts, the text before the
+# delimiter, the delimiter and the text after it, with the whitespace around
+# the delimiter removed.
+Lexeme = Tuple[str, str, Optional[Delimeter], str]
+
+
+class Lexer:
+    """
+    Classifies a text as a cloze, a standalone question/answer, a question
+    and answer separated by a delimiter, or plain text.
+
+    The cloze marker and the delimiters are literals combined into a single
+    precompiled pattern, so a text is classified in one scan, in time linear
+    in its length, regardless of the configured delimiters.
+    """
+
+    def __init__(self, delimiters: Optional[Dict[str, str]] = None):
+        self.delimiters = {**DEFAULT_DELIMITERS, **(delimiters or {})}
+
+        for kind, delimiter in self.delimiters.items():
+            if kind not in DEFAULT_DELIMITERS:
+                raise ValueError(
+                    "Unknown delimiter {!r}, expected one of: {}".format(
+                        kind, ", ".join(DEFAULT_DELIMITERS)
+                    )
+                )
+
+            if not delimiter or delimiter != delimiter.strip():
+                raise ValueError(
+                    "Delimiter {!r} for {} must be non-empty and must not "
+                    "start or end with whitespace".format(delimiter, kind)
+                )
+
+        if len(set(self.delimiters.values())) != len(self.delimiters):
+            raise ValueError("Delimiters must be distinct")
+
+        self.kinds = {
+            delimiter: DEFAULT_DELIMITERS[kind]
+            for kind, delimiter in self.delimiters.items()
+        }
+
+        # Longer delimiters first, so e.g. "::?" is not matched as "::".
+        delimiters_pattern = "|".join(
+            re.escape(d) for d in sorted(self.kinds, key=len, reverse=True)
+        )
+
+        self.cloze_regexp = re.compile(CLOZE_PATTERN)
+        self.regexp = re.compile(
+            "(?P<cloze>{})|(?P<delimiter>{})".format(CLOZE_PATTERN, delimiters_pattern)
+        )
+
+    def lex(self, text: str) -> Lexeme:
+        match = self.regexp.search(text)
+
+        if match is None:
+            return (PLAIN, text, None, "")
+
+        if match.lastgroup == "cloze":
+            return (CLOZE, text, None, "")
+
+        # A cloze anywhere in the text takes precedence over the delimiter.
+        if self.cloze_regexp.search(text, match.start() + 1):
+            return (CLOZE, text, None, "")
+
+        delimiter = Delimeter(self.kinds[match.group()])
+        before = text[: match.start()].rstrip()
+        after = text[match.end() :].lstrip()
+
+        if match.start() == 0:
+            return (STANDALONE, before, delimiter, after)
+
+        return (BASIC, before, delimiter, after)
+
+
+# Lexers are shared, as compiling the pattern for every parser is wasteful.
+@functools.cache
+def cached_lexer(delimiters: Tuple[Tuple[str, str], ...]) -> Lexer:
+    return Lexer(dict(delimiters))
+
+
+def get_lexer(delimiters: Optional[Dict[str, str]] = None) -> Lexer:
+    return cached_lexer(tuple(sorted((delimiters or {}).items())))
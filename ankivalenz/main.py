@@ -1,11 +1,23 @@
-from datetime import datetime
+import contextlib
+import json
+import os
 import pathlib
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 import typer
-from importlib import metadata
-from . import generator
+from .timings import Timings
+
+if TYPE_CHECKING:
+    from .cache import Cache
+    from .spill import CardStore
+
+# The generator, the parsers and genanki are imported by the commands that use
+# them, so `version` and `help` start without loading Markdown, HTML and Anki
+# libraries. `benchmarks/startup.py` checks the import time.
 
 app = typer.Typer()
 
+WRITERS = ["genanki", "native"]
+
 
 @app.command()
 def help():
@@ -14,40 +26,385 @@ def help():
     typer.echo("Commands:")
     typer.echo("  init    Initialize an ankivalenz.json file")
     typer.echo("  run    Run Ankivalenz")
+    typer.echo("  watch    Run Ankivalenz whenever a file changes")
     typer.echo("  version    Show the version of Ankivalenz")
     typer.echo("  help    Show this message and exit.")
 
 
 @app.command()
 def version():
+    from importlib import metadata
+
     typer.echo(f"Ankivalenz version {metadata.version('ankivalenz')}")
 
 
 @app.command()
-def run(path: str):
-    time = datetime.now()
+def run(
+    path: str,
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Parse every file, ignoring the build cache."
+    ),
+    jobs: int = typer.Option(
+        1, "--jobs", "-j", help="Number of processes to parse files with."
+    ),
+    html_backend: Optional[str] = typer.Option(
+        None,
+        "--html-backend",
+        help="BeautifulSoup backend: html.parser, lxml or html5lib.",
+    ),
+    writer: str = typer.Option(
+        "genanki",
+        "--writer",
+        help="Package writer: genanki, or native for faster writes of large decks.",
+    ),
+    show_timings: bool = typer.Option(
+        False, "--timings", help="Show the time spent in each stage."
+    ),
+    top: int = typer.Option(
+        10, "--top", help="Number of slowest files to show with --timings."
+    ),
+    profile: Optional[str] = typer.Option(
+        None, "--profile", help="Write cProfile output to this file."
+    ),
+    report: Optional[str] = typer.Option(
+        None, "--report", help="Write the timings as JSON to this file."
+    ),
+    delta: bool = typer.Option(
+        False,
+        "--delta",
+        help="Only add notes that were added or changed since the last build.",
+    ),
+    removed_path: Optional[str] = typer.Option(
+        None,
+        "--removed",
+        help="Write the notes removed since the last build as JSON to this file.",
+    ),
+    force: bool = typer.Option(
+        False, "--force", help="Build even if nothing changed since the last build."
+    ),
+    spill: bool = typer.Option(
+        False,
+        "--spill",
+        help="Keep parsed cards in a temporary database instead of in memory.",
+    ),
+):
+    if writer not in WRITERS:
+        raise typer.BadParameter(
+            "expected one of: {}".format(", ".join(WRITERS)), param_hint="--writer"
+        )
+
+    from . import generator
+    from .fingerprint import Fingerprint, input_digest, stat_files
+    from .manifest import note_tag
+    from .spill import CardStore
+
     full_path = pathlib.Path(path)
-    package = generator.package(full_path, time=time)
+    timings = Timings()
+    settings = generator.load_settings(full_path, html_backend=html_backend)
+    removed: Dict[str, dict] = {}
+    profiler = None
+
+    if profile is not None:
+        import cProfile
+
+        # Only profiles this process, so use --jobs 1 to profile parsing.
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    with timings.stage("total"):
+        with timings.stage("check"):
+            (apkg_path, options, sources) = build_inputs(
+                full_path, settings, writer, delta
+            )
+            previous_fingerprint = Fingerprint.load(full_path)
+            up_to_date = not force and previous_fingerprint.digest == input_digest(
+                settings,
+                options,
+                stat_files([*sources, *previous_fingerprint.media, apkg_path]),
+            )
+
+        if up_to_date:
+            # Nothing was removed since the last build, and the timings and
+            # the removed notes are still written.
+            typer.echo("- {} is up to date".format(apkg_path))
+        else:
+            # The store is only needed until the package has been written.
+            with CardStore() if spill else contextlib.nullcontext() as store:
+                removed = build_package(
+                    full_path,
+                    settings,
+                    writer=writer,
+                    delta=delta,
+                    timings=timings,
+                    cache=not no_cache,
+                    jobs=jobs,
+                    html_backend=html_backend,
+                    store=store,
+                )
+
+    if profiler is not None and profile is not None:
+        profiler.disable()
+        profiler.dump_stats(profile)
+
+    if removed_path is not None:
+        with open(removed_path, "w") as f:
+            json.dump(
+                [
+                    {"guid": guid, **entry, "tag": note_tag(guid)}
+                    for guid, entry in removed.items()
+                ],
+                f,
+                indent=2,
+            )
+
+    if show_timings:
+        print_timings(timings, top)
+
+    if report is not None:
+        with open(report, "w") as f:
+            json.dump(timings.report(top), f, indent=2)
+
 
-    apkg_path = package.decks[0].name + ".apkg"
-    package.write_to_file(apkg_path)
+# The package a build of `full_path` writes, the options that change it, and
+# the files the build reads, other than media.
+def build_inputs(
+    full_path: pathlib.Path, settings: dict, writer: str, delta: bool
+) -> Tuple[str, dict, List[pathlib.Path]]:
+    from . import generator
+
+    apkg_path = settings["deck_name"] + (".delta.apkg" if delta else ".apkg")
+    # Only the options that change the package.
+    options = {"writer": writer, "delta": delta}
+
+    return (apkg_path, options, generator.source_files(full_path, settings))
+
+
+# Builds the deck of `full_path` and writes the package, then records the
+# build in the manifest and the fingerprint, and prints what changed since the
+# last build. Shared by `run` and `watch`, so both write the same package and
+# track the same builds. Returns the notes removed since the last build, with
+# their entries in the last manifest.
+def build_package(
+    full_path: pathlib.Path,
+    settings: dict,
+    writer: str = "genanki",
+    delta: bool = False,
+    timings: Optional[Timings] = None,
+    cache: Union[bool, "Cache"] = True,
+    jobs: int = 1,
+    html_backend: Optional[str] = None,
+    store: Optional["CardStore"] = None,
+) -> Dict[str, dict]:
+    from . import generator
+    from .apkg import write_genanki_package, write_package
+    from .fingerprint import Fingerprint, input_digest, latest_mtime, stat_files
+    from .manifest import Manifest, search_for
+    from .spill import SpilledManifest
+
+    if timings is None:
+        timings = Timings()
+
+    (apkg_path, options, sources) = build_inputs(full_path, settings, writer, delta)
+    # With a store, the notes are compared with the last build in its
+    # database, rather than in memory.
+    manifest = SpilledManifest(store) if store is not None else Manifest()
+    # The files are stat'ed before they are read, so a file that changes
+    # during the build is built again by the next one.
+    source_stats = stat_files(sources)
+
+    package = generator.package(
+        full_path,
+        cache=cache,
+        jobs=jobs,
+        html_backend=html_backend,
+        timings=timings,
+        manifest=manifest,
+        store=store,
+    )
+
+    (added, changed, removed) = manifest.compare(full_path)
+
+    if delta:
+        package = generator.delta_package(package, {*added, *changed})
+
+    media = [str(media_path) for media_path in package.media_files]
+    input_stats = {**source_stats, **stat_files(media)}
+    # The notes are dated by the files they are built from, rather than the
+    # time of the build, so the same files give the same package.
+    timestamp = latest_mtime(input_stats)
+
+    with timings.stage("write"):
+        if writer == "native":
+            apkg_writer = write_package(package, apkg_path, timestamp=timestamp)
+            timings.add_time("media", apkg_writer.media_seconds)
+        else:
+            write_genanki_package(package, apkg_path, timestamp=timestamp)
+
+    media_bytes = sum(os.path.getsize(p) for p in package.media_files)
+    timings.count("media bytes", media_bytes)
 
     typer.echo(
         "- Added {} notes to deck {} in {}".format(
             len(package.decks[0].notes), package.decks[0].name, apkg_path
         )
     )
-    typer.echo("- Import the .apkg file into Anki (File -> Import)")
-    typer.echo("- Find and delete orphaned notes with this filter (Browse):")
     typer.echo(
-        '    deck:"{}" -tag:ankivalenz:updated:{}'.format(
-            package.decks[0].name, int(time.timestamp())
+        "- Added {} media files ({:.1f} MiB){}".format(
+            len(package.media_files),
+            media_bytes / 2**20,
+            (
+                " in {:.2f} s".format(timings.stages["media"])
+                if "media" in timings.stages
+                else ""
+            ),
         )
     )
+    typer.echo(
+        "- {} notes added, {} changed and {} removed since the last build".format(
+            len(added), len(changed), len(removed)
+        )
+    )
+    typer.echo("- Import the .apkg file into Anki (File -> Import)")
+
+    # Only record the build once the package has been written.
+    manifest.save(full_path)
+    Fingerprint(
+        input_digest(settings, options, {**input_stats, **stat_files([apkg_path])}),
+        media,
+    ).save(full_path)
+
+    if removed:
+        typer.echo(
+            "- {} notes were removed since the last build. Find and delete "
+            "them with this filter (Browse):".format(len(removed))
+        )
+        typer.echo("    {}".format(search_for(package.decks[0].name, list(removed))))
+
+    return removed
+
+
+def print_timings(timings: Timings, top: int) -> None:
+    typer.echo("Timings:")
+
+    for name, seconds in timings.stages.items():
+        typer.echo("  {:<12} {:>9.3f} s".format(name, seconds))
+
+    typer.echo("Counts:")
+
+    for name, count in timings.counts.items():
+        typer.echo("  {:<12} {:>9}".format(name, count))
+
+    slowest = timings.slowest_files(top)
+
+    if slowest:
+        typer.echo("Slowest files:")
+
+        for file_path, seconds in slowest:
+            typer.echo("  {:>9.3f} s  {}".format(seconds, file_path))
+
+
+@app.command()
+def watch(
+    path: str,
+    jobs: int = typer.Option(
+        1, "--jobs", "-j", help="Number of processes to parse files with."
+    ),
+    html_backend: Optional[str] = typer.Option(
+        None,
+        "--html-backend",
+        help="BeautifulSoup backend: html.parser, lxml or html5lib.",
+    ),
+    interval: float = typer.Option(
+        0.5, "--interval", help="Seconds between checks for changes."
+    ),
+):
+    from . import generator
+    from .cache import Cache
+    from .walker import IGNORE_FILE, Ignore
+    from .watch import (
+        IMAGE_EXTENSIONS,
+        FileWatcher,
+        WatcherGroup,
+        create_watcher,
+        wait_for_changes,
+    )
+
+    full_path = pathlib.Path(path)
+    # Changes to the settings or the ignore file reload them, as they change
+    # which files are watched.
+    config_watcher = FileWatcher(
+        [full_path / "ankivalenz.json", full_path / IGNORE_FILE]
+    )
+    files_watcher = None
+
+    # Errors are reported, rather than ending the watcher, as notes are
+    # often saved while they are being edited.
+    def build(settings: dict, card_cache: Cache) -> None:
+        try:
+            build_package(
+                full_path,
+                settings,
+                cache=card_cache,
+                jobs=jobs,
+                html_backend=html_backend,
+            )
+        except Exception as error:
+            typer.echo("- Build failed: {}: {}".format(type(error).__name__, error))
+
+    try:
+        while True:
+            try:
+                settings = generator.load_settings(full_path, html_backend=html_backend)
+                input_path = full_path / settings.get("input_path", "")
+                extensions = [
+                    *generator.input_extensions(settings.get("input_ext", "md")),
+                    *IMAGE_EXTENSIONS,
+                ]
+                # Changes to ignored files do not start a build.
+                files_watcher = create_watcher(
+                    input_path,
+                    extensions,
+                    Ignore.load(full_path, settings.get("exclude", [])),
+                )
+            except Exception as error:
+                typer.echo(
+                    "- Could not load the settings: {}: {}".format(
+                        type(error).__name__, error
+                    )
+                )
+                wait_for_changes(config_watcher, interval=interval)
+                continue
+
+            # Keep parsed files in memory between builds, so only changed
+            # files are parsed again.
+            card_cache = Cache(full_path, settings)
+            watcher = WatcherGroup([config_watcher, files_watcher])
+
+            build(settings, card_cache)
+            typer.echo("- Watching {} for changes (Ctrl+C to stop)".format(input_path))
+
+            while True:
+                changes = wait_for_changes(watcher, interval=interval)
+
+                if changes & set(config_watcher.paths):
+                    typer.echo("- Settings changed, reloading")
+                    files_watcher.stop()
+                    files_watcher = None
+                    break
+
+                typer.echo("- {} file(s) changed".format(len(changes)))
+                build(settings, card_cache)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if files_watcher is not None:
+            files_watcher.stop()
 
 
 @app.command()
 def init(path: str):
+    from . import generator
+
     full_path = pathlib.Path(path).resolve()
     json_path = generator.init(full_path)
 
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import pathlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import genanki
+
+MANIFEST_PATH = pathlib.Path(".ankivalenz") / "manifest.jsonl"
+
+
+# Hash of everything about a note that ends up in Anki, so a note with the
+# same hash does not need to be imported again.
+def note_hash(note: genanki.Note) -> str:
+    digest = hashlib.sha256(str(note.model.model_id).encode())
+
+    for value in [*note.fields, *note.tags]:
+        digest.update(b"\0")
+        digest.update(value.encode())
+
+    return digest.hexdigest()
+
+
+# A tag that identifies the note with `guid`, so notes can be found in Anki,
+# which cannot search by GUID. The tag only depends on the GUID, so it never
+# changes. It is flat, as Anki shows the parts of a tag separated by "::" as
+# a tree of tags.
+def note_tag(guid: str) -> str:
+    return "ankivalenz-{}".format(hashlib.sha256(guid.encode()).hexdigest()[:16])
+
+
+# An Anki search for the notes with `guids` in `deck_name`.
+def search_for(deck_name: str, guids: List[str]) -> str:
+    tags = " OR ".join("tag:{}".format(note_tag(guid)) for guid in guids)
+
+    return 'deck:"{}" ({})'.format(deck_name, tags)
+
+
+class Manifest:
+    """
+    The notes of a build, by GUID, with the hash of their content and the
+    file they were found in. Comparing the manifests of two builds tells
+    which notes were added, changed or removed.
+    """
+
+    def __init__(self, notes: Optional[Dict[str, dict]] = None):
+        self.notes: Dict[str, dict] = notes or {}
+
+    def add(self, note: genanki.Note, source: Optional[str] = None) -> None:
+        self.notes[note.guid] = {"hash": note_hash(note), "source": source}
+
+    def added(self, previous: "Manifest") -> List[str]:
+        return [guid for guid in self.notes if guid not in previous.notes]
+
+    def changed(self, previous: "Manifest") -> List[str]:
+        return [
+            guid
+            for guid, entry in self.notes.items()
+            if guid in previous.notes and previous.notes[guid]["hash"] != entry["hash"]
+        ]
+
+    def removed(self, previous: "Manifest") -> List[str]:
+        return [guid for guid in previous.notes if guid not in self.notes]
+
+    # The notes added, changed and removed since the build whose manifest is
+    # saved in `path`, with the entries of the removed notes in that manifest.
+    def compare(
+        self, path: pathlib.Path
+    ) -> Tuple[List[str], List[str], Dict[str, dict]]:
+        previous = Manifest.load(path)
+        removed = {guid: previous.notes[guid] for guid in self.removed(previous)}
+
+        return (self.added(previous), self.changed(previous), removed)
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "Manifest":
+        try:
+            return cls(dict(read_manifest(path)))
+        except (OSError, ValueError, KeyError):
+            return cls()
+
+    def save(self, path: pathlib.Path) -> None:
+        write_manifest(path, sorted(self.notes.items()))
+
+
+# The GUID and entry of each note in the manifest saved in `path`. The
+# manifest has a line per note, so it can be read without loading all of it,
+# see `spill.SpilledManifest`.
+def read_manifest(path: pathlib.Path) -> Iterator[Tuple[str, dict]]:
+    with (path / MANIFEST_PATH).open() as f:
+        for line in f:
+            entry = json.loads(line)
+
+            yield (entry.pop("guid"), entry)
+
+
+# Saves a manifest of `notes`, which are (GUID, entry) pairs, sorted by GUID.
+def write_manifest(path: pathlib.Path, notes: Iterable[Tuple[str, dict]]) -> None:
+    manifest_path = path / MANIFEST_PATH
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix(".tmp")
+
+    with tmp_path.open("w") as f:
+        for guid, entry in notes:
+            f.write(json.dumps({"guid": guid, **entry}, sort_keys=True) + "\n")
+
+    # Replace atomically, like cache entries.
+    os.replace(tmp_path, manifest_path)
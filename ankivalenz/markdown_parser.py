@@ -1,7 +1,8 @@
-import itertools
-import re
-from typing import List, Sequence, Tuple
-from ankivalenz.html_parser import HtmlParser
+import functools
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from ankivalenz.html_parser import HtmlParser, available_backend
+from ankivalenz.token_parser import TokenParser
 from markdown_it import MarkdownIt
 from mdit_py_plugins.attrs import attrs_plugin
 from mdit_py_plugins.dollarmath import dollarmath_plugin
@@ -9,34 +10,84 @@ from markdown_it.renderer import RendererProtocol
 from markdown_it.token import Token
 from markdown_it.utils import OptionsDict, EnvType
 
-from .types import ClozeNode, Delimeter, Node
+from .timings import Timings
+from .lexer import get_lexer
+from .types import Node
 
-BASIC_REGEXP = r"(.*?)\s*(::\?|\?::|::)\s*(.*)"
-STANDALONE_REGEXP = r"^(::\?|\?::|::)\s*(.*)"
-CLOZE_REGEXP = r".*{{c\d+::.*"
+
+def render_math_inline(
+    self: RendererProtocol,
+    tokens: Sequence[Token],
+    idx: int,
+    options: OptionsDict,
+    env: EnvType,
+) -> str:
+    content = str(tokens[idx].content).strip()
+    return f"\\({content}\\)"
+
+
+# Building and configuring a MarkdownIt instance is relatively expensive, so
+# it is done once per process and shared by all parsers.
+@functools.cache
+def markdown_it() -> MarkdownIt:
+    md = MarkdownIt().use(attrs_plugin).use(dollarmath_plugin, double_inline=True)
+
+    # Override render rules for math to use \( and \[
+    md.add_render_rule("math_inline", render_math_inline)
+
+    return md
+
+
+PARSERS = ["html", "tokens"]
 
 
 class MarkdownParser:
-    def __init__(self):
-        self.md = MarkdownIt()
+    def __init__(
+        self,
+        parser: str = "html",
+        html_backend: str = "html.parser",
+        delimiters: Optional[Dict[str, str]] = None,
+        timings: Optional[Timings] = None,
+    ):
+        if parser not in PARSERS:
+            raise ValueError(
+                "Unknown parser {!r}, expected one of: {}".format(
+                    parser, ", ".join(PARSERS)
+                )
+            )
+
+        self.md = markdown_it()
+        self.parser = parser
+        self.html_backend = available_backend(html_backend)
+        # Check the delimiters up front, rather than on the first parse.
+        get_lexer(delimiters)
+        self.delimiters = delimiters
+        self.timings = timings if timings is not None else Timings()
 
     def parse(self, text: str) -> Tuple[List[Node], List[str]]:
-        md = MarkdownIt().use(attrs_plugin).use(dollarmath_plugin, double_inline=True)
+        start = time.perf_counter()
+
+        if self.parser == "tokens":
+            with self.timings.stage("tokens"):
+                result = TokenParser(self.md, self.html_backend, self.delimiters).parse(
+                    text
+                )
+        else:
+            # Parse and render the markdown
+            with self.timings.stage("markdown"):
+                html = self.md.render(text).strip()
 
-        def render_math_inline(
-            self: RendererProtocol,
-            tokens: Sequence[Token],
-            idx: int,
-            options: OptionsDict,
-            env: EnvType,
-        ) -> str:
-            content = str(tokens[idx].content).strip()
-            return f"\\({content}\\)"
+            with self.timings.stage("html"):
+                result = HtmlParser(self.html_backend, self.delimiters).parse(html)
 
-        # Override render rules for math to use \( and \[
-        md.add_render_rule("math_inline", render_math_inline)
+        self.timings.parse_times.append(time.perf_counter() - start)
 
-        # Parse and render the markdown
-        html = md.render(text).strip()
+        return result
 
-        return HtmlParser().parse(html)
+    # Parses each of `texts` with the same engine. Returns an iterator, so each
+    # result can be used before the next text is parsed.
+    def parse_many(
+        self, texts: Iterable[str]
+    ) -> Iterator[Tuple[List[Node], List[str]]]:
+        for text in texts:
+            yield self.parse(text)
@@ -1,41 +1,85 @@
-from typing import List
-from .types import Node, Delimeter, BasicCard, Card, ClozeCard
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+from .types import Node, Delimeter, BasicCard, Card, ClozeCard, Path
+
+ID_REGEXP = re.compile(r"\{#([\w:.-]+)\}")
+
+
+# Splits an explicit note ID, e.g. `{#sun-color}`, from the end of `text`.
+def split_id(text: str) -> Tuple[str, Optional[str]]:
+    if not text.endswith("}"):
+        return (text, None)
+
+    start = text.rfind("{#")
+
+    if start != -1 and (match := ID_REGEXP.fullmatch(text, start)):
+        return (text[:start].rstrip(), match.group(1))
+
+    return (text, None)
 
 
 class NodeParser:
+    def __init__(self):
+        # Equal paths are stored once and shared by every card with that path.
+        self.paths: Dict[Path, Path] = {}
+
+    def intern_path(self, path: Path) -> Path:
+        return self.paths.setdefault(path, path)
+
+    # Parses `nodes` into cards, in the order they appear. Uses a stack
+    # instead of recursion, so deeply nested nodes do not hit the recursion
+    # limit.
     def parse(
-        self, nodes: Node, cards: List[Card] = None, path: List[str] = None
+        self, nodes: Node, cards: List[Card] = None, path: Sequence[str] = ()
     ) -> List[Card]:
         if cards is None:
             cards = []
 
-        if path is None:
-            path = []
-
-        match nodes:
-            case list(l):
-                for node in l:
-                    self.parse(node, cards, path.copy())
-            case (str(header), list(l)):
-                path.append(header)
-                return self.parse(l, cards, path.copy())
-            case str(question):
-                return cards.append(ClozeCard(question, path.copy()))
-            case (Delimeter("::"), str(answer)):
-                return cards.append(
-                    BasicCard(path[-1], answer, path[:-1], reverse=True)
-                )
-            case (Delimeter("?::"), str(answer)):
-                return cards.append(BasicCard(path[-1], answer, path[:-1]))
-            case (Delimeter("::?"), str(question)):
-                return cards.append(BasicCard(question, path[-1], path[:-1]))
-            case (str(question), Delimeter("?::"), str(answer)):
-                return cards.extend([BasicCard(question, answer, path.copy())])
-            case (str(answer), Delimeter("::?"), str(question)):
-                return cards.extend([BasicCard(question, answer, path.copy())])
-            case (str(question), Delimeter("::"), str(answer)):
-                return cards.extend(
-                    [BasicCard(question, answer, path.copy(), reverse=True)]
-                )
+        stack = [(nodes, tuple(path))]
+
+        while stack:
+            (node, path) = stack.pop()
+
+            match node:
+                case list(l):
+                    # Reversed, so the first node is parsed first.
+                    stack.extend((child, path) for child in reversed(l))
+                case (str(header), list(l)):
+                    stack.append((l, self.intern_path(path + (header,))))
+                case str(question):
+                    (question, id) = split_id(question)
+                    cards.append(ClozeCard(question, path, id=id))
+                case (Delimeter("::"), str(answer)):
+                    (answer, id) = split_id(answer)
+                    cards.append(
+                        BasicCard(
+                            path[-1],
+                            answer,
+                            self.intern_path(path[:-1]),
+                            reverse=True,
+                            id=id,
+                        )
+                    )
+                case (Delimeter("?::"), str(answer)):
+                    (answer, id) = split_id(answer)
+                    cards.append(
+                        BasicCard(path[-1], answer, self.intern_path(path[:-1]), id=id)
+                    )
+                case (Delimeter("::?"), str(question)):
+                    (question, id) = split_id(question)
+                    cards.append(
+                        BasicCard(
+                            question, path[-1], self.intern_path(path[:-1]), id=id
+                        )
+                    )
+                case (str(question), Delimeter("?::"), str(answer)):
+                    (answer, id) = split_id(answer)
+                    cards.append(BasicCard(question, answer, path, id=id))
+                case (str(answer), Delimeter("::?"), str(question)):
+                    (question, id) = split_id(question)
+                    cards.append(BasicCard(question, answer, path, id=id))
+                case (str(question), Delimeter("::"), str(answer)):
+                    (answer, id) = split_id(answer)
+                    cards.append(BasicCard(question, answer, path, reverse=True, id=id))
 
         return cards
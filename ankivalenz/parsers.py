@@ -0,0 +1,68 @@
+import pathlib
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+
+from .html_parser import HtmlParser
+from .markdown_parser import MarkdownParser
+from .timings import Timings
+from .types import Node
+
+# Elements of HTML documents without notes. E.g. CSS in <style> could otherwise
+# be taken for a front/back card, as in `a::before`.
+NON_CONTENT_TAGS = ["head", "script", "style", "template"]
+
+
+class HtmlFileParser:
+    """
+    Parses HTML files, e.g. exported from other tools, directly with
+    `HtmlParser`, without rendering Markdown. Takes the same options as
+    `MarkdownParser`, of which `parser` does not apply to HTML.
+    """
+
+    def __init__(
+        self,
+        parser: str = "html",
+        html_backend: str = "html.parser",
+        delimiters: Optional[Dict[str, str]] = None,
+        timings: Optional[Timings] = None,
+    ):
+        self.html_parser = HtmlParser(html_backend, delimiters, NON_CONTENT_TAGS)
+        self.timings = timings if timings is not None else Timings()
+
+    def parse(self, text: str) -> Tuple[List[Node], List[str]]:
+        start = time.perf_counter()
+
+        with self.timings.stage("html"):
+            result = self.html_parser.parse(text)
+
+        self.timings.parse_times.append(time.perf_counter() - start)
+
+        return result
+
+    # Same as `MarkdownParser.parse_many`.
+    def parse_many(
+        self, texts: Iterable[str]
+    ) -> Iterator[Tuple[List[Node], List[str]]]:
+        for text in texts:
+            yield self.parse(text)
+
+
+# The parser of each file format.
+PARSERS: Dict[str, Type[Union[MarkdownParser, HtmlFileParser]]] = {
+    "markdown": MarkdownParser,
+    "html": HtmlFileParser,
+}
+
+# The format of files with each extension. Files with any other extension are
+# parsed as Markdown.
+FORMATS = {"md": "markdown", "html": "html", "htm": "html"}
+
+
+def file_format(path: Union[str, pathlib.Path]) -> str:
+    return FORMATS.get(pathlib.PurePath(path).suffix[1:].lower(), "markdown")
+
+
+def create_parser(
+    format: str, options: Optional[dict] = None, timings: Optional[Timings] = None
+) -> Union[MarkdownParser, HtmlFileParser]:
+    return PARSERS[format](**(options or {}), timings=timings)
@@ -0,0 +1,230 @@
+import itertools
+import json
+import os
+import pathlib
+import sqlite3
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import genanki
+
+from .manifest import note_hash, read_manifest, write_manifest
+from .types import BasicCard, Card, ClozeCard, Path
+
+# Cards are added to and read from the store this many at a time.
+BATCH_SIZE = 1000
+
+
+class CardStore:
+    """
+    Cards spilled to a temporary SQLite database as files are parsed, and
+    read back in batches, so a build never holds every card of the vault in
+    memory. Iterating the store yields each card in the order they were
+    added, with its GUID and the number of cards before it with the same GUID,
+    see `generator.iter_notes`.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        (db_file, self.path) = tempfile.mkstemp(suffix=".sqlite", dir=directory)
+        os.close(db_file)
+
+        self.conn = sqlite3.connect(self.path)
+        # The cards are only read back by this build, and the file is removed
+        # when the store is closed, so they need not survive a crash.
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        # The rowid is the order the cards were added in. Cloze cards have no
+        # answer.
+        self.conn.execute(
+            "CREATE TABLE cards (guid TEXT NOT NULL, question TEXT NOT NULL, "
+            "answer TEXT, path TEXT NOT NULL, reverse INTEGER NOT NULL, id TEXT, "
+            "source TEXT)"
+        )
+        self.count = 0
+        self.indexed = False
+
+    def add(self, cards: Iterable[Tuple[Card, str]]) -> None:
+        cards = iter(cards)
+
+        while rows := [
+            card_row(card, guid) for (card, guid) in itertools.islice(cards, BATCH_SIZE)
+        ]:
+            self.conn.executemany(
+                "INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self.count += len(rows)
+
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Tuple[Card, str, int]]:
+        # Building the index once all cards are added is faster than updating
+        # it for each card.
+        if not self.indexed:
+            self.conn.execute("CREATE INDEX cards_guid ON cards (guid)")
+            self.indexed = True
+
+        cursor = self.conn.execute(
+            "SELECT *, (SELECT COUNT(*) FROM cards AS earlier "
+            "WHERE earlier.guid = cards.guid AND earlier.rowid < cards.rowid) "
+            "FROM cards ORDER BY rowid"
+        )
+
+        while rows := cursor.fetchmany(BATCH_SIZE):
+            # Equal paths are shared within a batch, like `NodeParser` does.
+            paths: Dict[str, Path] = {}
+
+            for row in rows:
+                yield (row_card(row, paths), row[0], row[-1])
+
+    def close(self) -> None:
+        self.conn.close()
+        os.remove(self.path)
+
+    def __enter__(self) -> "CardStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class SpilledManifest:
+    """
+    A `Manifest` kept in the database of a `CardStore`. The last manifest is
+    read into the database one note at a time and compared with the notes of
+    the build there, so neither manifest is ever held in memory as a whole.
+    """
+
+    def __init__(self, store: CardStore):
+        self.conn = store.conn
+        # Rows are in the order the notes were added, as in `Manifest`.
+        for table in ["notes", "previous"]:
+            self.conn.execute(
+                "CREATE TABLE {} (guid TEXT PRIMARY KEY, hash TEXT NOT NULL, "
+                "source TEXT)".format(table)
+            )
+        self.pending: List[Tuple[str, str, Optional[str]]] = []
+
+    def add(self, note: genanki.Note, source: Optional[str] = None) -> None:
+        self.pending.append((note.guid, note_hash(note), source))
+
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO notes VALUES (?, ?, ?)", self.pending
+        )
+        self.conn.commit()
+        self.pending = []
+
+    # Same as `Manifest.compare`, but the added and changed notes are queried
+    # as they are counted or iterated. The removed notes are returned as a
+    # dict, as they are all listed after a build.
+    def compare(
+        self, path: pathlib.Path
+    ) -> Tuple["GuidQuery", "GuidQuery", Dict[str, dict]]:
+        self.flush()
+        self.conn.execute("DELETE FROM previous")
+
+        try:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO previous VALUES (?, ?, ?)",
+                (
+                    (guid, entry["hash"], entry["source"])
+                    for (guid, entry) in read_manifest(path)
+                ),
+            )
+        except (OSError, ValueError, KeyError):
+            # Same as a missing manifest, like `Manifest.load`.
+            self.conn.execute("DELETE FROM previous")
+
+        self.conn.commit()
+
+        added = GuidQuery(
+            self.conn,
+            "SELECT guid FROM notes WHERE guid NOT IN (SELECT guid FROM previous) "
+            "ORDER BY rowid",
+        )
+        changed = GuidQuery(
+            self.conn,
+            "SELECT notes.guid FROM notes JOIN previous USING (guid) "
+            "WHERE notes.hash != previous.hash ORDER BY notes.rowid",
+        )
+        removed = {
+            guid: {"hash": digest, "source": source}
+            for (guid, digest, source) in self.conn.execute(
+                "SELECT guid, hash, source FROM previous "
+                "WHERE guid NOT IN (SELECT guid FROM notes) ORDER BY rowid"
+            )
+        }
+
+        return (added, changed, removed)
+
+    def save(self, path: pathlib.Path) -> None:
+        self.flush()
+        write_manifest(
+            path,
+            (
+                (guid, {"hash": digest, "source": source})
+                for (guid, digest, source) in self.conn.execute(
+                    "SELECT guid, hash, source FROM notes ORDER BY guid"
+                )
+            ),
+        )
+
+
+class GuidQuery:
+    """
+    The GUIDs returned by a query of a `SpilledManifest`, only read from the
+    database when they are counted or iterated, e.g. by `ankivalenz run
+    --delta`.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, query: str):
+        self.conn = conn
+        self.query = query
+
+    def __len__(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM ({})".format(self.query)
+        ).fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        for (guid,) in self.conn.execute(self.query):
+            yield guid
+
+
+def card_row(card: Card, guid: str) -> tuple:
+    if isinstance(card, BasicCard):
+        (answer, reverse) = (card.answer, card.reverse)
+    else:
+        (answer, reverse) = (None, False)
+
+    return (
+        guid,
+        card.question,
+        answer,
+        json.dumps(card.path),
+        reverse,
+        card.id,
+        card.source,
+    )
+
+
+# The card of a row of the `cards` table. Equal paths are shared by the cards
+# created with the same `paths`.
+def row_card(row: tuple, paths: Dict[str, Path]) -> Card:
+    (_, question, answer, path_json, reverse, id, source) = row[:7]
+
+    if path_json not in paths:
+        paths[path_json] = tuple(json.loads(path_json))
+
+    if answer is None:
+        return ClozeCard(question, paths[path_json], id=id, source=source)
+
+    return BasicCard(
+        question, answer, paths[path_json], bool(reverse), id=id, source=source
+    )
@@ -0,0 +1,132 @@
+import re
+from typing import List, Optional, Tuple
+
+ATX_HEADING = re.compile(r"(#{1,6})(?:[ \t\r]|$)")
+INDENTED_HEADING = re.compile(r" {1,3}#{1,6}(?:[ \t\r]|$)")
+FENCE = re.compile(r" {0,3}(`{3,}|~{3,})")
+MATH_BLOCK = re.compile(r" {0,3}\$\$")
+HTML_BLOCK = re.compile(r" {0,3}<")
+
+# Markdown that affects other parts of the document: link reference
+# definitions apply to the whole document, raw HTML blocks can leave tags open
+# across headings, and headings in raw HTML, setext headings and indented
+# headings can close sections the split does not know about. Documents with any
+# of these are not split, see also `split_text`.
+UNSPLITTABLE = re.compile(r"^ {0,3}\[[^\]]+\]:|<h[1-6][\s/>]", re.M | re.I)
+SETEXT_UNDERLINE = re.compile(r" {0,3}(?:=+|-+)[ \t\r]*$")
+
+
+class Block:
+    """
+    The kind of multi-line block a line is in, so headings inside code and
+    math are not mistaken for section boundaries. Fences end at a line
+    matching `end`.
+    """
+
+    def __init__(self, kind: str, end: Optional[re.Pattern] = None):
+        self.kind = kind
+        self.end = end
+
+
+# Finds the block that starts at `line`, if any.
+def block_start(line: str) -> Optional[Block]:
+    if match := FENCE.match(line):
+        fence = match.group(1)
+
+        return Block(
+            "fence",
+            re.compile(r" {0,3}" + fence[0] + "{" + str(len(fence)) + r",}[ \t\r]*$"),
+        )
+
+    if MATH_BLOCK.match(line):
+        rest = line.strip()
+
+        # `$$x$$` on a single line.
+        if len(rest) > 3 and rest.endswith("$$"):
+            return None
+
+        return Block("math")
+
+    return None
+
+
+# Returns `True` if `line` is the last line of `block`. Math blocks end at a
+# line ending with `$$`, or a blank line, where markdown-it gives up on the
+# block.
+def block_ends(block: Block, line: str) -> bool:
+    if block.end is not None:
+        return bool(block.end.match(line))
+
+    return line.strip() == "" or line.strip().endswith("$$")
+
+
+# Splits `text` into parts of at least `size` characters at ATX headings
+# (`# Heading`). Each part is returned with a prefix of the heading lines of
+# the sections it continues, e.g. `"# Chapter\n## Section\n"`, so parsing the
+# prefix and the part gives the notes with the same paths as parsing the
+# whole text. Returns the whole text as a single part if it cannot be split
+# safely, or is not larger than `size`.
+def split_text(text: str, size: int) -> List[Tuple[str, str]]:
+    if len(text) <= size or UNSPLITTABLE.search(text):
+        return [("", text)]
+
+    lines = text.split("\n")
+    # Index of the first line and prefix of each part.
+    starts: List[Tuple[int, str]] = [(0, "")]
+    part_size = 0
+    # Open sections, as (level, heading line).
+    sections: List[Tuple[int, str]] = []
+    block: Optional[Block] = None
+    # Whether the previous line can be the text of a setext heading.
+    after_text = False
+
+    for idx, line in enumerate(lines):
+        if block is not None:
+            # The contents of code and math blocks are literal.
+            if block_ends(block, line):
+                block = None
+
+            after_text = False
+            part_size += len(line) + 1
+            continue
+
+        if (
+            HTML_BLOCK.match(line)
+            or INDENTED_HEADING.match(line)
+            or (after_text and SETEXT_UNDERLINE.match(line))
+            # `$$` right after text can continue a paragraph in a list.
+            or (after_text and MATH_BLOCK.match(line))
+        ):
+            return [("", text)]
+
+        after_text = line.strip() != ""
+
+        if match := ATX_HEADING.match(line):
+            level = len(match.group(1))
+
+            while sections and sections[-1][0] >= level:
+                sections.pop()
+
+            if part_size >= size:
+                starts.append((idx, "".join(h + "\n" for (_, h) in sections)))
+                part_size = 0
+
+            sections.append((level, line))
+            # A `---` line after a heading is a thematic break.
+            after_text = False
+        else:
+            block = block_start(line)
+
+        part_size += len(line) + 1
+
+    parts = []
+
+    for (start, prefix), (end, _) in zip(starts, starts[1:] + [(len(lines), "")]):
+        part = "\n".join(lines[start:end])
+
+        if end < len(lines):
+            part += "\n"
+
+        parts.append((prefix, part))
+
+    return parts
@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+import time
+from typing import Dict, List
+
+
+class Timings:
+    """
+    Wall time of each stage of a build, the parse time of each file, and
+    counts, e.g. of files and cards.
+
+    Stages that run in worker processes, such as "markdown" and "nodes", are
+    summed over all processes, so they can add up to more than the wall time
+    of the "parse" stage.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.files: Dict[str, float] = {}
+        # Time of each call to `MarkdownParser.parse`, in order.
+        self.parse_times: List[float] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name: str, count: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def merge(self, other: "Timings") -> None:
+        for name, seconds in other.stages.items():
+            self.add_time(name, seconds)
+
+        for name, count in other.counts.items():
+            self.count(name, count)
+
+        self.files.update(other.files)
+        self.parse_times.extend(other.parse_times)
+
+    def slowest_files(self, top: int) -> List[tuple]:
+        return sorted(self.files.items(), key=lambda item: item[1], reverse=True)[:top]
+
+    def report(self, top: int = 10) -> dict:
+        return {
+            "stages": self.stages,
+            "counts": self.counts,
+            "slowest_files": [
+                {"path": path, "seconds": seconds}
+                for (path, seconds) in self.slowest_files(top)
+            ],
+        }
@@ -0,0 +1,206 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from bs4 import BeautifulSoup, NavigableString
+from markdown_it import MarkdownIt
+from markdown_it.renderer import RendererHTML
+from markdown_it.token import Token
+
+from .html_parser import HtmlParser
+from .types import Node
+
+# Token types with a render rule that produces a self-contained HTML fragment.
+# The fragment is parsed on its own and added to the tree.
+FRAGMENT_RULES = {
+    "code_block",
+    "fence",
+    "math_block",
+    "math_block_label",
+    "math_inline_double",
+}
+
+
+class Unsupported(Exception):
+    pass
+
+
+class TreeBuilder:
+    """
+    Builds a BeautifulSoup tree by sending it the same events the HTML parser
+    would send for the rendered HTML, so adjacent strings are merged and
+    attributes are handled exactly as when parsing.
+    """
+
+    def __init__(self):
+        self.soup = BeautifulSoup("", "html.parser")
+
+        # Keep the tree builder attached, so HTML fragments can be fed to it.
+        self.soup.builder.initialize_soup(self.soup)
+
+    def append_text(self, text: str) -> None:
+        # The HTML parser never sends empty strings, and BeautifulSoup would
+        # turn them into a space.
+        if text:
+            self.soup.handle_data(text)
+
+    def open(self, name: str, attrs: dict) -> None:
+        self.soup.handle_starttag(name, None, None, attrs)
+
+    def close(self, name: str) -> None:
+        self.soup.handle_endtag(name)
+
+    def void(self, name: str, attrs: dict) -> None:
+        self.open(name, attrs)
+        self.close(name)
+
+    def fragment(self, html: str) -> None:
+        self.soup.builder.feed(html)
+
+    def finish(self) -> BeautifulSoup:
+        self.soup.endData()
+
+        # Same as stripping the rendered HTML.
+        contents = self.soup.contents
+
+        if contents and isinstance(contents[-1], NavigableString):
+            text = str(contents[-1]).rstrip()
+            if text:
+                contents[-1].replace_with(NavigableString(text))
+            else:
+                contents[-1].extract()
+
+        return self.soup
+
+
+class TokenParser:
+    """
+    Parses Markdown into nodes without rendering HTML.
+
+    The tree `HtmlParser` walks is built directly from markdown-it's token
+    stream, mirroring what the HTML renderer would produce, which saves
+    rendering the HTML and parsing it again. Documents with raw HTML are
+    rendered and parsed as usual with `html_backend`, as raw HTML can span
+    several tokens.
+    """
+
+    def __init__(
+        self,
+        md: MarkdownIt,
+        html_backend: str = "html.parser",
+        delimiters: Optional[Dict[str, str]] = None,
+    ):
+        # Tokens are built with the render rules of the HTML renderer.
+        assert isinstance(md.renderer, RendererHTML)
+
+        self.md = md
+        self.renderer = md.renderer
+        self.html_backend = html_backend
+        self.delimiters = delimiters
+
+    def parse(self, text: str) -> Tuple[List[Node], List[str]]:
+        env: dict = {}
+        tokens = self.md.parse(text, env)
+
+        try:
+            soup = self.build(tokens, env)
+        except Unsupported:
+            return HtmlParser(self.html_backend, self.delimiters).parse(
+                self.renderer.render(tokens, self.md.options, env).strip()
+            )
+
+        return HtmlParser(delimiters=self.delimiters).parse_tree(soup)
+
+    def build(self, tokens: Sequence[Token], env: dict) -> BeautifulSoup:
+        builder = TreeBuilder()
+
+        for idx, token in enumerate(tokens):
+            if token.type == "inline":
+                children = token.children or []
+
+                for child_idx in range(len(children)):
+                    self.build_token(builder, children, child_idx, env)
+            else:
+                self.build_token(builder, tokens, idx, env)
+
+        return builder.finish()
+
+    def build_token(
+        self, builder: TreeBuilder, tokens: Sequence[Token], idx: int, env: dict
+    ) -> None:
+        token = tokens[idx]
+        options = self.md.options
+
+        if token.type == "text":
+            builder.append_text(token.content)
+        elif token.type == "softbreak":
+            if options.breaks:
+                builder.void("br", {})
+            builder.append_text("\n")
+        elif token.type == "hardbreak":
+            builder.void("br", {})
+            builder.append_text("\n")
+        elif token.type == "image":
+            attrs = dict(token.attrs)
+            attrs["alt"] = (
+                self.renderer.renderInlineAsText(token.children, options, env)
+                if token.children
+                else ""
+            )
+            builder.void("img", attrs)
+        elif token.type == "code_inline":
+            builder.open("code", dict(token.attrs))
+            builder.append_text(token.content)
+            builder.close("code")
+        elif token.type == "math_inline":
+            content = str(token.content).strip()
+
+            # The content is rendered as raw HTML, see `render_math_inline`.
+            if "<" in content or "&" in content:
+                raise Unsupported(token.type)
+
+            builder.append_text(f"\\({content}\\)")
+        elif token.type in FRAGMENT_RULES:
+            builder.fragment(self.renderer.rules[token.type](tokens, idx, options, env))
+        elif token.type == "list_item_open" and not (
+            token.meta and "checked" in token.meta
+        ):
+            self.build_tag(builder, tokens, idx)
+        elif token.type in self.renderer.rules:
+            raise Unsupported(token.type)
+        else:
+            self.build_tag(builder, tokens, idx)
+
+    # Mirrors `RendererHTML.renderToken`, including the newlines it adds
+    # between block-level tags.
+    def build_tag(
+        self, builder: TreeBuilder, tokens: Sequence[Token], idx: int
+    ) -> None:
+        token = tokens[idx]
+
+        # Tight list paragraphs
+        if token.hidden:
+            return
+
+        if token.block and token.nesting != -1 and idx and tokens[idx - 1].hidden:
+            builder.append_text("\n")
+
+        if token.nesting == 1:
+            builder.open(token.tag, dict(token.attrs))
+        elif token.nesting == -1:
+            builder.close(token.tag)
+        else:
+            builder.void(token.tag, dict(token.attrs))
+
+        need_lf = False
+
+        if token.block:
+            need_lf = True
+
+            if token.nesting == 1 and idx + 1 < len(tokens):
+                next_token = tokens[idx + 1]
+
+                if next_token.type == "inline" or next_token.hidden:
+                    need_lf = False
+                elif next_token.nesting == -1 and next_token.tag == token.tag:
+                    need_lf = False
+
+        if need_lf:
+            builder.append_text("\n")
@@ -1,34 +1,66 @@
 from dataclasses import dataclass, field
-from typing import Tuple, Union
+from typing import NamedTuple, Optional, Tuple, Union
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Delimeter:
     contents: str
 
 
-PathNode = Tuple[str, list["Node"]]
-BasicNode = Tuple[str, Delimeter, str]
-StandaloneNode = Tuple[Delimeter, str]
+# Nodes are named tuples, so they take no more memory than plain tuples, and
+# plain tuples of the same shape can be used in their place, e.g. in tests.
+class PathNode(NamedTuple):
+    header: str
+    children: list["Node"]
+
+
+class BasicNode(NamedTuple):
+    before: str
+    delimeter: Delimeter
+    after: str
+
+
+class StandaloneNode(NamedTuple):
+    delimeter: Delimeter
+    text: str
+
+
 ClozeNode = str
 
 Node = Union[list["Node"], PathNode, BasicNode, StandaloneNode, ClozeNode]
 
+Path = Tuple[str, ...]
+
 
-@dataclass(order=True)
+# `id` is an explicit note ID given with `{#id}`, and `source` is the path of
+# the file the card was found in. Both identify the note in Anki, but are not
+# part of the card's content.
+#
+# Cards are immutable, and their path is a tuple, which is shared by all cards
+# with the same path when parsed by `NodeParser`. A path can also be given as
+# a list; `tuple` returns tuples as they are, so shared paths stay shared.
+@dataclass(order=True, frozen=True, slots=True)
 class BasicCard:
     question: str
     answer: str
-    path: list[str]
+    path: Path
     reverse: bool = False
+    id: Optional[str] = field(default=None, compare=False)
+    source: Optional[str] = field(default=None, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "path", tuple(self.path))
 
 
-@dataclass(order=True)
+@dataclass(order=True, frozen=True, slots=True)
 class ClozeCard:
     question: str
-    path: list[str]
+    path: Path
+    id: Optional[str] = field(default=None, compare=False)
+    source: Optional[str] = field(default=None, compare=False)
 
+    def __post_init__(self):
+        object.__setattr__(self, "path", tuple(self.path))
 
-Card = Union[BasicCard, ClozeCard]
 
-Path = list[str]
+Card = Union[BasicCard, ClozeCard]
@@ -0,0 +1,228 @@
+import os
+import pathlib
+import re
+from typing import Iterable, Iterator, List, Optional, Union
+
+# Gitignore-style patterns of files and folders to leave out, in the folder
+# with `ankivalenz.json`.
+IGNORE_FILE = ".ankivalenzignore"
+
+# The folder Ankivalenz keeps its cache, manifest and fingerprint in, next to
+# `ankivalenz.json`. It is never walked, like git never walks `.git`.
+STATE_DIR = ".ankivalenz"
+
+
+class IgnorePattern:
+    """
+    A single line of a gitignore file, e.g. `drafts/` or `!*.keep.md`.
+    """
+
+    __slots__ = ["regex", "negated", "directory_only"]
+
+    def __init__(self, regex: re.Pattern, negated: bool, directory_only: bool):
+        self.regex = regex
+        self.negated = negated
+        self.directory_only = directory_only
+
+
+# Translates a gitignore glob to a regular expression matching paths relative
+# to the folder of the ignore file. `*` and `?` do not match `/`, while `**/`
+# matches any number of folders and a trailing `/**` everything inside a folder.
+def translate(pattern: str) -> str:
+    regex = []
+    idx = 0
+
+    while idx < len(pattern):
+        char = pattern[idx]
+
+        if char == "*":
+            end = idx
+
+            while end < len(pattern) and pattern[end] == "*":
+                end += 1
+
+            whole_segment = (idx == 0 or pattern[idx - 1] == "/") and (
+                end == len(pattern) or pattern[end] == "/"
+            )
+
+            if whole_segment and end - idx == 2:
+                if end == len(pattern):
+                    regex.append(".*")
+                else:
+                    regex.append("(?:.*/)?")
+                    end += 1
+            else:
+                regex.append("[^/]*")
+
+            idx = end
+            continue
+
+        if char == "?":
+            regex.append("[^/]")
+        elif char == "[" and (end := pattern.find("]", idx + 2)) != -1:
+            chars = pattern[idx + 1 : end].replace("\\", "\\\\")
+
+            if chars[0] in "!^":
+                regex.append("[^/" + chars[1:] + "]")
+            else:
+                regex.append("[" + chars + "]")
+
+            idx = end
+        elif char == "\\" and idx + 1 < len(pattern):
+            idx += 1
+            regex.append(re.escape(pattern[idx]))
+        else:
+            regex.append(re.escape(char))
+
+        idx += 1
+
+    return "".join(regex)
+
+
+# Parses a line of a gitignore file, or returns `None` for blank lines and
+# comments.
+def parse_pattern(line: str) -> Optional[IgnorePattern]:
+    pattern = line.rstrip("\r\n").rstrip(" ")
+
+    # Trailing spaces are kept if escaped with a backslash.
+    if pattern.endswith("\\") and len(pattern) < len(line.rstrip("\r\n")):
+        pattern += " "
+
+    if not pattern or pattern.startswith("#"):
+        return None
+
+    negated = pattern.startswith("!")
+
+    if negated:
+        pattern = pattern[1:]
+
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+
+    if not pattern:
+        return None
+
+    # A pattern with a `/` before its end is relative to the folder of the
+    # ignore file, and otherwise matches at any depth.
+    anchored = "/" in pattern
+    regex = translate(pattern.lstrip("/"))
+
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+
+    return IgnorePattern(re.compile(regex, re.S), negated, directory_only)
+
+
+class Ignore:
+    """
+    Paths to leave out, given as gitignore patterns relative to `root`. The
+    last pattern matching a path decides whether it is ignored, and nothing
+    inside an ignored folder can be included again.
+    """
+
+    def __init__(self, root: pathlib.Path, patterns: Iterable[str] = ()):
+        self.root = root
+        self.patterns: List[IgnorePattern] = [
+            pattern for pattern in map(parse_pattern, patterns) if pattern is not None
+        ]
+
+    # The patterns in `.ankivalenzignore` in `root`, if any, followed by
+    # `exclude`, the `exclude` option of `ankivalenz.json`.
+    @classmethod
+    def load(
+        cls, root: pathlib.Path, exclude: Union[str, Iterable[str]] = ()
+    ) -> "Ignore":
+        lines: List[str] = []
+        ignore_path = root / IGNORE_FILE
+
+        if ignore_path.is_file():
+            lines = ignore_path.read_text().splitlines()
+
+        if isinstance(exclude, str):
+            exclude = [exclude]
+
+        return cls(root, [*lines, *exclude])
+
+    # `relative` is a path relative to `root`, with `/` as separator.
+    def match(self, relative: str, is_dir: bool) -> bool:
+        for pattern in reversed(self.patterns):
+            if (is_dir or not pattern.directory_only) and pattern.regex.fullmatch(
+                relative
+            ):
+                return not pattern.negated
+
+        return False
+
+    # Returns `True` if `path`, or a folder it is in, is ignored.
+    def ignored(self, path: pathlib.Path, is_dir: bool = False) -> bool:
+        parts = self.relative(path).split("/")
+
+        for end in range(1, len(parts)):
+            if self.match("/".join(parts[:end]), True):
+                return True
+
+        return self.match("/".join(parts), is_dir)
+
+    # `path` relative to `root`, with `/` as separator.
+    def relative(self, path: Union[str, pathlib.Path]) -> str:
+        relative = pathlib.Path(os.path.relpath(path, self.root)).as_posix()
+
+        return "" if relative == "." else relative
+
+
+# Yields the files in `path` and its subfolders that are not ignored by
+# `ignore`. Ignored folders are skipped without listing their contents, and
+# symlinks to folders are not followed, like `pathlib.Path.glob("**")`. The
+# `STATE_DIR` in `path` is always skipped.
+def walk(path: pathlib.Path, ignore: Optional[Ignore] = None) -> Iterator[os.DirEntry]:
+    if ignore is not None and not ignore.patterns:
+        ignore = None
+
+    prefix = ""
+
+    if ignore is not None and (prefix := ignore.relative(path)):
+        prefix += "/"
+
+    root = os.fspath(path)
+    folders = [(root, prefix)]
+
+    while folders:
+        (folder, relative) = folders.pop()
+
+        try:
+            entries = os.scandir(folder)
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = not is_dir and entry.is_file()
+                except OSError:
+                    continue
+
+                if is_dir and entry.name == STATE_DIR and folder == root:
+                    continue
+
+                if ignore is not None and ignore.match(relative + entry.name, is_dir):
+                    continue
+
+                if is_dir:
+                    folders.append((entry.path, relative + entry.name + "/"))
+                elif is_file:
+                    yield entry
+
+
+# The files in `path` ending with `.<extension>` for any of `extensions`,
+# sorted.
+def find_files(
+    path: pathlib.Path, extensions: Iterable[str], ignore: Optional[Ignore] = None
+) -> List[pathlib.Path]:
+    suffixes = tuple("." + extension for extension in extensions)
+
+    return sorted(
+        pathlib.Path(entry.path)
+        for entry in walk(path, ignore)
+        if entry.name.endswith(suffixes)
+    )
@@ -0,0 +1,205 @@
+import pathlib
+import queue
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .walker import Ignore, walk
+
+IMAGE_EXTENSIONS = ["png", "jpg", "jpeg", "gif", "svg", "webp"]
+
+CHANGE_EVENTS = ["created", "modified", "deleted", "moved"]
+
+Snapshot = Dict[pathlib.Path, Tuple[int, int]]
+
+
+def has_extension(path: pathlib.Path, extensions: List[str]) -> bool:
+    return path.suffix[1:].lower() in extensions
+
+
+# Returns the modification time and size of every file with one of
+# `extensions` in `path`, that is not ignored by `ignore`.
+def snapshot(
+    path: pathlib.Path, extensions: List[str], ignore: Optional[Ignore] = None
+) -> Snapshot:
+    files = {}
+
+    for entry in walk(path, ignore):
+        file_path = pathlib.Path(entry.path)
+
+        if has_extension(file_path, extensions):
+            stat = entry.stat()
+            files[file_path] = (stat.st_mtime_ns, stat.st_size)
+
+    return files
+
+
+def changed_paths(old: Snapshot, new: Snapshot) -> Set[pathlib.Path]:
+    return {path for path in old.keys() | new.keys() if old.get(path) != new.get(path)}
+
+
+class PollingWatcher:
+    """
+    Finds changes by comparing snapshots of the files. Used when watchdog is
+    not installed.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        extensions: List[str],
+        ignore: Optional[Ignore] = None,
+    ):
+        self.path = path
+        self.extensions = extensions
+        self.ignore = ignore
+        self.snapshot = snapshot(path, extensions, ignore)
+
+    def poll(self) -> Set[pathlib.Path]:
+        new = snapshot(self.path, self.extensions, self.ignore)
+        changes = changed_paths(self.snapshot, new)
+        self.snapshot = new
+
+        return changes
+
+    def stop(self) -> None:
+        pass
+
+
+class EventWatcher:
+    """
+    Collects file system events (inotify on Linux) with watchdog.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        extensions: List[str],
+        ignore: Optional[Ignore] = None,
+    ):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        self.extensions = extensions
+        self.ignore = ignore
+        self.events: "queue.Queue[pathlib.Path]" = queue.Queue()
+
+        events = self.events
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # Ignore e.g. "opened" events from reading images when
+                # writing the package.
+                if event.is_directory or event.event_type not in CHANGE_EVENTS:
+                    return
+
+                for attr in ["src_path", "dest_path"]:
+                    if value := getattr(event, attr, None):
+                        events.put(pathlib.Path(str(value)))
+
+        self.observer = Observer()
+        self.observer.schedule(Handler(), str(path), recursive=True)
+        self.observer.start()
+
+    def poll(self) -> Set[pathlib.Path]:
+        changes = set()
+
+        while not self.events.empty():
+            path = self.events.get_nowait()
+
+            if has_extension(path, self.extensions) and not (
+                self.ignore is not None and self.ignore.ignored(path)
+            ):
+                changes.add(path)
+
+        return changes
+
+    def stop(self) -> None:
+        self.observer.stop()
+        self.observer.join()
+
+
+class FileWatcher:
+    """
+    Finds changes to a few files, which need not exist, e.g. the settings,
+    which may be outside the watched folder.
+    """
+
+    def __init__(self, paths: List[pathlib.Path]):
+        self.paths = paths
+        self.snapshot = stat_paths(paths)
+
+    def poll(self) -> Set[pathlib.Path]:
+        new = stat_paths(self.paths)
+        changes = changed_paths(self.snapshot, new)
+        self.snapshot = new
+
+        return changes
+
+    def stop(self) -> None:
+        pass
+
+
+def stat_paths(paths: List[pathlib.Path]) -> Snapshot:
+    files = {}
+
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+
+        files[path] = (stat.st_mtime_ns, stat.st_size)
+
+    return files
+
+
+class WatcherGroup:
+    """
+    The changes found by several watchers.
+    """
+
+    def __init__(self, watchers: list):
+        self.watchers = watchers
+
+    def poll(self) -> Set[pathlib.Path]:
+        return set().union(*(watcher.poll() for watcher in self.watchers))
+
+    def stop(self) -> None:
+        for watcher in self.watchers:
+            watcher.stop()
+
+
+def create_watcher(
+    path: pathlib.Path, extensions: List[str], ignore: Optional[Ignore] = None
+):
+    try:
+        return EventWatcher(path, extensions, ignore)
+    except (ImportError, OSError):
+        return PollingWatcher(path, extensions, ignore)
+
+
+# Waits for changes, and returns once no more changes have been seen for
+# `debounce` seconds, so a burst of changes, e.g. an editor saving several
+# files, results in a single build.
+def wait_for_changes(
+    watcher,
+    interval: float = 0.5,
+    debounce: float = 0.5,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Set[pathlib.Path]:
+    changes: Set[pathlib.Path] = set()
+    quiet = 0.0
+
+    while True:
+        new = watcher.poll()
+
+        if new:
+            changes |= new
+            quiet = 0.0
+        elif changes:
+            quiet += interval
+
+            if quiet >= debounce:
+                return changes
+
+        sleep(interval)
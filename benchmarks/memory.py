@@ -0,0 +1,117 @@
+"""
+Measures how much the peak memory of `ankivalenz run --spill` grows while
+building a large vault, and fails if it grows more than the budget.
+
+    python -m benchmarks.memory --files 200 --cards 1000 --budget 32
+
+Every note has changed since the last build, whose manifest is written a line
+at a time. Cards are created without parsing Markdown, which would take
+minutes, and does not depend on the size of the vault. The cache is left out,
+as it only keeps entries on disk with --spill.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import sys
+import tempfile
+
+from ankivalenz import generator
+from ankivalenz.main import app
+from ankivalenz.manifest import write_manifest
+from ankivalenz.types import BasicCard
+
+
+def questions(file_idx: int, cards: int) -> list:
+    return ["Q{} {}".format(file_idx, card) for card in range(cards)]
+
+
+def generate_vault(vault: pathlib.Path, files: int, cards: int) -> None:
+    (vault / "ankivalenz.json").write_text(
+        json.dumps({"deck_id": 1, "deck_name": "Big"})
+    )
+
+    for idx in range(files):
+        (vault / "{:03}.md".format(idx)).write_text(
+            "".join(question + " ?:: A\n" for question in questions(idx, cards))
+        )
+
+    write_manifest(
+        vault,
+        (
+            (
+                generator.card_guid(
+                    BasicCard(question, "A", ("Path",), source="{:03}.md".format(idx))
+                ),
+                {"hash": "", "source": "{:03}.md".format(idx)},
+            )
+            for idx in range(files)
+            for question in questions(idx, cards)
+        ),
+    )
+
+
+# One card per line, without parsing.
+def parse_texts(texts, **kwargs):
+    return [
+        ([BasicCard(*line.split(" ?:: "), ("Path",)) for line in text.splitlines()], [])
+        for text in texts
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--cards", type=int, default=1000, help="cards per file")
+    parser.add_argument(
+        "--budget", type=float, default=32, help="largest allowed growth in MiB"
+    )
+    parser.add_argument(
+        "--no-spill", action="store_true", help="keep the cards in memory"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    try:
+        import resource
+    except ImportError:
+        raise SystemExit("The resource module is not available on this platform")
+
+    with tempfile.TemporaryDirectory() as directory:
+        vault = pathlib.Path(directory)
+        generate_vault(vault, args.files, args.cards)
+        generator.parse_texts = parse_texts
+        # Packages are written to the working directory.
+        os.chdir(vault)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        app(
+            [
+                "run",
+                str(vault),
+                *([] if args.no_spill else ["--spill"]),
+                "--writer",
+                "native",
+                "--no-cache",
+            ],
+            standalone_mode=False,
+        )
+
+        # In KiB on Linux, and in bytes on macOS.
+        scale = 2**20 if sys.platform == "darwin" else 2**10
+        growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / scale
+
+    if args.json:
+        print(json.dumps({"growth_mib": growth, "budget_mib": args.budget}, indent=2))
+    else:
+        print(
+            "{:>18} {:>9.1f} MiB (max {:.0f} MiB)".format("growth", growth, args.budget)
+        )
+
+    if growth > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
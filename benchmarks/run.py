@@ -0,0 +1,146 @@
+"""
+Runs the Ankivalenz pipeline stage by stage on a synthetic vault, and reports
+the wall time and peak memory of each stage.
+
+    python -m benchmarks.run --files 500 --headings 20
+"""
+
+import argparse
+from contextlib import contextmanager
+import json
+import os
+import pathlib
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+from bs4 import BeautifulSoup
+
+from ankivalenz.generator import cards_to_notes, load_cards, package
+from ankivalenz.html_parser import HtmlParser
+from ankivalenz.markdown_parser import MarkdownParser
+from ankivalenz.node_parser import NodeParser
+
+from .vault import generate_vault
+
+
+class Stages:
+    def __init__(self, memory: bool):
+        self.memory = memory
+        self.results: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            result = {"seconds": time.perf_counter() - start}
+
+            if self.memory:
+                result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            self.results[name] = result
+
+
+def run(
+    vault: pathlib.Path, memory: bool, options: dict
+) -> Dict[str, Dict[str, float]]:
+    stages = Stages(memory)
+    markdown_parser = MarkdownParser(**options)
+
+    texts: List[str] = [p.read_text() for p in sorted(vault.glob("**/*.md"))]
+
+    with stages.stage("MarkdownParser.parse"):
+        parsed = [markdown_parser.parse(text) for text in texts]
+
+    with stages.stage("MarkdownIt.render"):
+        htmls = [markdown_parser.md.render(text).strip() for text in texts]
+
+    soups = [BeautifulSoup(html, "html.parser") for html in htmls]
+    html_parser = HtmlParser()
+
+    with stages.stage("HtmlParser.find_nodes"):
+        for soup in soups:
+            html_parser.find_nodes(soup.contents)
+
+    with stages.stage("NodeParser.parse"):
+        for nodes, _ in parsed:
+            NodeParser().parse(nodes)
+
+    with stages.stage("load_cards"):
+        (cards, _) = load_cards(vault, options=options)
+
+    with stages.stage("cards_to_notes"):
+        cards_to_notes(cards)
+
+    with stages.stage("package"):
+        apkg = package(vault)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with stages.stage("Package.write_to_file"):
+            apkg.write_to_file(os.path.join(tmp, "deck.apkg"))
+
+    return stages.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=2, help="directory depth")
+    parser.add_argument(
+        "--nesting", type=int, default=0, help="heading and list nesting depth"
+    )
+    parser.add_argument("--headings", type=int, default=10)
+    parser.add_argument("--cards", type=int, default=5, help="cards per list")
+    parser.add_argument("--cloze", type=float, default=0.2, help="cloze fraction")
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--parser", default="html", help="html or tokens")
+    parser.add_argument(
+        "--memory", action="store_true", help="trace peak memory (slower)"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Image paths are resolved relative to the working directory.
+        cwd = os.getcwd()
+        os.chdir(tmp)
+
+        try:
+            vault = generate_vault(
+                pathlib.Path("vault"),
+                files=args.files,
+                depth=args.depth,
+                nesting=args.nesting,
+                headings=args.headings,
+                cards=args.cards,
+                cloze=args.cloze,
+                images=args.images,
+                settings={"parser": args.parser},
+            )
+            results = run(vault, memory=args.memory, options={"parser": args.parser})
+        finally:
+            os.chdir(cwd)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for name, result in results.items():
+        line = "{:<24} {:>9.3f} s".format(name, result["seconds"])
+
+        if "peak_bytes" in result:
+            line += " {:>9.1f} MiB".format(result["peak_bytes"] / 2**20)
+
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Measures how the time `HtmlParser.find_nodes` takes to split a document into
+sections grows with the number of headings, and fails if it grows faster than
+linearly.
+
+    python -m benchmarks.sections --headings 10000
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from ankivalenz.html_parser import HtmlParser
+
+
+def headings(count: int) -> str:
+    return "\n".join(
+        "<h2>Header {}</h2>\n<ul>\n<li>Q{} ?:: A{}</li>\n</ul>".format(i, i, i)
+        for i in range(count)
+    )
+
+
+def find_nodes_time(html: str, runs: int) -> float:
+    elements = BeautifulSoup(html, "html.parser").contents
+
+    # Use the fastest of a few runs, to reduce noise from the machine.
+    timings = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        HtmlParser().find_nodes(elements)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--headings", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=8,
+        help="largest allowed time ratio for 4x the headings",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    small = find_nodes_time(headings(args.headings // 4), args.runs)
+    large = find_nodes_time(headings(args.headings), args.runs)
+    # 4x the headings should take roughly 4x the time. Quadratic sectioning
+    # takes 16x.
+    ratio = large / small
+
+    if args.json:
+        print(
+            json.dumps(
+                {"small_seconds": small, "large_seconds": large, "ratio": ratio},
+                indent=2,
+            )
+        )
+    else:
+        print("{:>9} headings {:>9.3f} s".format(args.headings // 4, small))
+        print("{:>9} headings {:>9.3f} s".format(args.headings, large))
+        print("{:>18} {:>9.1f}x (max {:.0f}x)".format("ratio", ratio, args.max_ratio))
+
+    if ratio > args.max_ratio:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
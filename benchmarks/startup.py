@@ -0,0 +1,116 @@
+"""
+Measures the import time of Ankivalenz commands with `python -X importtime`,
+and fails if a command takes longer than the budget or imports the Markdown,
+HTML or Anki libraries it does not need.
+
+    python -m benchmarks.startup --budget 200
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Commands that should start without the libraries used to build decks.
+COMMANDS = ["version", "help"]
+
+HEAVY_MODULES = ["genanki", "bs4", "markdown_it", "mdit_py_plugins", "yaml"]
+
+
+# Parses the output of `-X importtime` into the self and cumulative import time
+# of each module, in microseconds.
+def parse_importtime(output: str) -> Dict[str, Tuple[int, int]]:
+    modules: Dict[str, Tuple[int, int]] = {}
+
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        (own, cumulative, name) = line[len("import time:") :].split("|")
+
+        if own.strip().isdigit():
+            modules[name.strip()] = (int(own), int(cumulative))
+
+    return modules
+
+
+# The time spent importing every module, including the interpreter's own.
+def total_time(modules: Dict[str, Tuple[int, int]]) -> int:
+    return sum(own for (own, _) in modules.values())
+
+
+def measure(command: str, runs: int) -> Dict[str, Tuple[int, int]]:
+    # Use the fastest of a few runs, to reduce noise from the machine.
+    results: List[Dict[str, Tuple[int, int]]] = []
+
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "ankivalenz", command],
+            capture_output=True,
+            text=True,
+        )
+
+        if process.returncode != 0:
+            raise SystemExit(
+                "ankivalenz {} failed:\n{}".format(command, process.stderr[-2000:])
+            )
+
+        results.append(parse_importtime(process.stderr))
+
+    return min(results, key=total_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--commands", nargs="+", default=COMMANDS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget", type=float, default=200, help="import time budget in ms"
+    )
+    parser.add_argument("--top", type=int, default=5, help="slowest modules to show")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+
+    for command in args.commands:
+        modules = measure(command, args.runs)
+        heavy = [name for name in modules if name in HEAVY_MODULES]
+        slowest = sorted(modules.items(), key=lambda m: m[1][1], reverse=True)
+        result = {
+            "milliseconds": total_time(modules) / 1000,
+            "slowest": [
+                (name, cumulative / 1000)
+                for (name, (_, cumulative)) in slowest[: args.top]
+            ],
+            "heavy_modules": heavy,
+        }
+        results[command] = result
+
+        if result["milliseconds"] > args.budget or heavy:
+            failed = True
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for command, result in results.items():
+            print(
+                "{:<12} {:>9.1f} ms (budget {:.0f} ms)".format(
+                    command, result["milliseconds"], args.budget
+                )
+            )
+
+            for name, milliseconds in result["slowest"]:
+                print("  {:>9.1f} ms  {}".format(milliseconds, name))
+
+            if result["heavy_modules"]:
+                print("  imports {}".format(", ".join(result["heavy_modules"])))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
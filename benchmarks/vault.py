@@ -0,0 +1,112 @@
+import json
+import os
+import pathlib
+import random
+from typing import Optional
+
+# The smallest valid PNG: a single transparent pixel.
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+)
+
+
+def note(
+    rng: random.Random,
+    idx: int,
+    headings: int,
+    cards: int,
+    cloze: float,
+    image: str = None,
+    nesting: int = 0,
+) -> str:
+    lines = ["# Note {}".format(idx), ""]
+
+    for heading in range(headings):
+        lines += ["## Heading {}".format(heading), ""]
+
+        # Markdown has no headings below <h6>.
+        for level in range(3, min(nesting, 4) + 3):
+            lines += ["#" * level + " Subheading {}".format(level), ""]
+
+        lines.append("- Topic {}".format(heading))
+
+        for level in range(nesting):
+            lines.append("  " * (level + 1) + "- Subtopic {}".format(level))
+
+        indent = "  " * (nesting + 1)
+
+        for card in range(cards):
+            if rng.random() < cloze:
+                lines.append(
+                    indent
+                    + "- The {{{{c1::answer {}}}}} to question {}".format(card, card)
+                )
+            else:
+                lines.append(
+                    indent
+                    + "- Question *{}* ?:: Answer **{}** $x^{}$".format(
+                        card, card, card
+                    )
+                )
+
+        if image is not None:
+            lines.append(indent + "- Image {} ?:: ![]({})".format(heading, image))
+
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+def generate_vault(
+    path: pathlib.Path,
+    files: int = 100,
+    depth: int = 2,
+    headings: int = 10,
+    cards: int = 5,
+    cloze: float = 0.2,
+    images: int = 10,
+    seed: int = 0,
+    settings: Optional[dict] = None,
+    nesting: int = 0,
+) -> pathlib.Path:
+    """
+    Writes a synthetic Ankivalenz project to `path`, with `files` notes spread
+    over directories `depth` levels deep. Each note has `headings` sections
+    with a list of `cards` cards, of which a fraction `cloze` are cloze
+    deletions, and refers to one of `images` images. The cards of each section
+    are nested `nesting` levels deeper, under as many subheadings (up to
+    <h6>) and nested lists. markdown-it drops lists nested more than 20
+    tokens deep, so cards nested more than 7 levels are left out. `settings`
+    are added to `ankivalenz.json`.
+    """
+    rng = random.Random(seed)
+
+    path.mkdir(parents=True, exist_ok=True)
+
+    with open(path / "ankivalenz.json", "w") as f:
+        json.dump(
+            {"deck_id": 1234567890, "deck_name": "Benchmark", **(settings or {})}, f
+        )
+
+    image_dir = path / "images"
+    image_dir.mkdir(exist_ok=True)
+
+    for idx in range(images):
+        (image_dir / "image-{}.png".format(idx)).write_bytes(PNG)
+
+    for idx in range(files):
+        file_dir = path.joinpath(*["dir-{}".format(idx % 3)] * depth)
+        file_dir.mkdir(parents=True, exist_ok=True)
+
+        image = None
+
+        if images > 0:
+            image_path = image_dir / "image-{}.png".format(idx % images)
+            image = pathlib.Path(os.path.relpath(image_path, file_dir)).as_posix()
+
+        (file_dir / "note-{}.md".format(idx)).write_text(
+            note(rng, idx, headings, cards, cloze, image, nesting)
+        )
+
+    return path
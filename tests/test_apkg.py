@@ -0,0 +1,179 @@
+import json
+import pathlib
+import sqlite3
+import zipfile
+
+import genanki
+
+from ankivalenz.apkg import (
+    CHUNK_SIZE,
+    ApkgWriter,
+    compress_type,
+    write_genanki_package,
+    write_package,
+)
+from ankivalenz.anki_models import BASIC_MODEL, CLOZE_MODEL
+from ankivalenz.generator import package
+
+
+def read_apkg(path, tmp_path):
+    with zipfile.ZipFile(path) as apkg:
+        names = apkg.namelist()
+        media = json.loads(apkg.read("media"))
+        files = {name: apkg.read(name) for name in names if name != "media"}
+
+    db_path = tmp_path / "collection.anki2"
+    db_path.write_bytes(files.pop("collection.anki2"))
+
+    conn = sqlite3.connect(db_path)
+    dump = list(conn.iterdump())
+    conn.close()
+
+    return (names, media, files, dump)
+
+
+class TestWritePackage:
+    def test_same_as_genanki(self, tmp_path, monkeypatch):
+        # Image paths are relative to the working directory.
+        monkeypatch.chdir(tmp_path)
+
+        vault = pathlib.Path("vault")
+        (vault / "images").mkdir(parents=True)
+        (vault / "images" / "a.png").write_bytes(b"png")
+        (vault / "ankivalenz.json").write_text(
+            json.dumps({"deck_id": 1, "deck_name": "Vault"})
+        )
+        (vault / "Cell.md").write_text(
+            "# Cell\n\n- Nucleus ?:: ![A](images/a.png)\n- Side 1 :: Side 2\n"
+        )
+        (vault / "Sun.md").write_text("- The {{c1::sun}} is {{c2::yellow}}\n")
+
+        apkg = package(vault)
+
+        apkg.write_to_file(tmp_path / "genanki.apkg", timestamp=12345.5)
+        write_package(apkg, tmp_path / "native.apkg", timestamp=12345.5)
+
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+
+        assert read_apkg(tmp_path / "genanki.apkg", tmp_path / "a") == read_apkg(
+            tmp_path / "native.apkg", tmp_path / "b"
+        )
+
+    def test_cloze_cards(self, tmp_path):
+        notes = [
+            genanki.Note(model=CLOZE_MODEL, fields=["{{c1::A}} {{c3::B}}", "", ""]),
+            genanki.Note(model=CLOZE_MODEL, fields=["No cloze", "", ""]),
+            genanki.Note(model=BASIC_MODEL, fields=["Q", "A", "Path"]),
+        ]
+        deck = genanki.Deck(1, "Deck")
+
+        for note in notes:
+            deck.add_note(note)
+
+        genanki.Package(deck).write_to_file(tmp_path / "genanki.apkg", timestamp=1)
+        ApkgWriter(1, "Deck").write_to_file(
+            tmp_path / "native.apkg", notes, [], timestamp=1
+        )
+
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+
+        assert read_apkg(tmp_path / "genanki.apkg", tmp_path / "a") == read_apkg(
+            tmp_path / "native.apkg", tmp_path / "b"
+        )
+
+    def test_streams_notes(self, tmp_path):
+        notes = (
+            genanki.Note(model=BASIC_MODEL, fields=[str(idx), "A", ""], guid=str(idx))
+            for idx in range(2500)
+        )
+        writer = ApkgWriter(1, "Deck")
+
+        writer.write_to_file(tmp_path / "native.apkg", notes, [], timestamp=1)
+
+        assert 2500 == writer.note_count
+
+
+class TestWriteGenankiPackage:
+    def test_same_as_genanki(self, tmp_path):
+        (tmp_path / "a.png").write_bytes(b"png")
+        deck = genanki.Deck(1, "Deck")
+        deck.add_note(genanki.Note(model=BASIC_MODEL, fields=["Q", "A", "Path"]))
+        apkg = genanki.Package(deck, [tmp_path / "a.png"])
+
+        apkg.write_to_file(tmp_path / "genanki.apkg", timestamp=1)
+        write_genanki_package(apkg, tmp_path / "deterministic.apkg", timestamp=1)
+
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+
+        assert read_apkg(tmp_path / "genanki.apkg", tmp_path / "a") == read_apkg(
+            tmp_path / "deterministic.apkg", tmp_path / "b"
+        )
+
+
+class TestDeterministic:
+    def package(self, tmp_path):
+        (tmp_path / "a.png").write_bytes(b"png")
+        deck = genanki.Deck(1, "Deck")
+        deck.add_note(genanki.Note(model=BASIC_MODEL, fields=["Q", "A", "Path"]))
+
+        return genanki.Package(deck, [tmp_path / "a.png"])
+
+    def test_same_file(self, tmp_path):
+        apkg = self.package(tmp_path)
+
+        for write in [write_package, write_genanki_package]:
+            write(apkg, tmp_path / "a.apkg", timestamp=1)
+            (tmp_path / "a.png").touch()
+            write(apkg, tmp_path / "b.apkg", timestamp=1)
+
+            assert (tmp_path / "a.apkg").read_bytes() == (
+                tmp_path / "b.apkg"
+            ).read_bytes()
+
+    def test_entries_not_dated(self, tmp_path):
+        write_package(self.package(tmp_path), tmp_path / "a.apkg", timestamp=1)
+
+        with zipfile.ZipFile(tmp_path / "a.apkg") as apkg:
+            assert {(1980, 1, 1, 0, 0, 0)} == {
+                info.date_time for info in apkg.infolist()
+            }
+
+
+class TestMedia:
+    def write(self, tmp_path, media_files):
+        writer = ApkgWriter(1, "Deck")
+        writer.write_to_file(tmp_path / "deck.apkg", [], media_files, timestamp=1)
+
+        return writer
+
+    def test_compress_type(self):
+        assert zipfile.ZIP_STORED == compress_type("images/a.PNG")
+        assert zipfile.ZIP_STORED == compress_type("images/a.jpeg")
+        assert zipfile.ZIP_DEFLATED == compress_type("images/a.svg")
+
+    def test_stores_compressed_formats(self, tmp_path):
+        (tmp_path / "a.png").write_bytes(b"a" * 1000)
+        (tmp_path / "b.svg").write_bytes(b"b" * 1000)
+
+        writer = self.write(tmp_path, [tmp_path / "a.png", tmp_path / "b.svg"])
+
+        with zipfile.ZipFile(tmp_path / "deck.apkg") as apkg:
+            assert {"0": "a.png", "1": "b.svg"} == json.loads(apkg.read("media"))
+            assert b"a" * 1000 == apkg.read("0")
+            assert b"b" * 1000 == apkg.read("1")
+            assert zipfile.ZIP_STORED == apkg.getinfo("0").compress_type
+            assert zipfile.ZIP_DEFLATED == apkg.getinfo("1").compress_type
+
+        assert 2000 == writer.media_bytes
+
+    def test_large_media(self, tmp_path):
+        data = bytes(range(256)) * (CHUNK_SIZE // 256 * 3 + 1)
+        (tmp_path / "a.mp4").write_bytes(data)
+
+        self.write(tmp_path, [tmp_path / "a.mp4"])
+
+        with zipfile.ZipFile(tmp_path / "deck.apkg") as apkg:
+            assert data == apkg.read("0")
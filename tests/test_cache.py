@@ -0,0 +1,106 @@
+import pathlib
+
+from ankivalenz import generator
+from ankivalenz.cache import Cache
+from ankivalenz.generator import load_cards
+from ankivalenz.types import BasicCard, ClozeCard
+
+
+class TestCache:
+    def setup_method(self):
+        self.cards = [
+            BasicCard("Question", "Answer", ["Header"], reverse=True),
+            ClozeCard("A {{c1::Cloze}}", ["Header"]),
+        ]
+
+    def test_roundtrip(self, tmp_path):
+        cache = Cache(tmp_path, {})
+        key = cache.key("text")
+        cache.set(key, self.cards, ["image.png"])
+
+        assert (self.cards, ["image.png"]) == Cache(tmp_path, {}).get(key)
+
+    def test_miss(self, tmp_path):
+        cache = Cache(tmp_path, {})
+
+        assert None == cache.get(cache.key("text"))
+
+    def test_key_depends_on_content(self, tmp_path):
+        cache = Cache(tmp_path, {})
+
+        assert cache.key("a") != cache.key("b")
+
+    def test_key_depends_on_parser_settings(self, tmp_path):
+        cache = Cache(tmp_path, {})
+
+        assert cache.key("text") != Cache(tmp_path, {"parser": "tokens"}).key("text")
+        assert cache.key("text") != Cache(tmp_path, {"split_size": 10}).key("text")
+
+    def test_key_ignores_deck_settings(self, tmp_path):
+        settings = {"deck_id": 1, "deck_name": "Biology", "exclude": ["drafts"]}
+        renamed = {"deck_id": 2, "deck_name": "Cells", "input_path": "notes"}
+
+        assert Cache(tmp_path, settings).key("text") == Cache(tmp_path, renamed).key(
+            "text"
+        )
+
+    def test_keeps_entries_in_memory(self, tmp_path):
+        cache = Cache(tmp_path, {})
+        key = cache.key("text")
+        cache.set(key, self.cards, [])
+
+        for entry_path in cache.path.iterdir():
+            entry_path.unlink()
+
+        assert (self.cards, []) == cache.get(key)
+
+    def test_not_in_memory(self, tmp_path):
+        cache = Cache(tmp_path, {}, in_memory=False)
+        key = cache.key("text")
+        cache.set(key, self.cards, [])
+
+        assert (self.cards, []) == cache.get(key)
+        assert {} == cache.entries
+
+    def test_prune(self, tmp_path):
+        cache = Cache(tmp_path, {})
+        cache.set(cache.key("a"), self.cards, [])
+
+        cache = Cache(tmp_path, {})
+        cache.set(cache.key("b"), self.cards, [])
+        cache.prune()
+
+        assert None == cache.get(cache.key("a"))
+        assert None != cache.get(cache.key("b"))
+
+
+class TestLoadCardsWithCache:
+    def test_skips_unchanged_files(self, tmp_path, monkeypatch):
+        path = pathlib.Path("sample/Biology")
+        (cards, image_paths) = load_cards(path, cache=Cache(tmp_path, {}))
+
+        def parse_texts(texts, **kwargs):
+            assert [] == texts, "files were parsed"
+            return []
+
+        monkeypatch.setattr(generator, "parse_texts", parse_texts)
+
+        assert (sorted(cards), sorted(image_paths)) == tuple(
+            map(sorted, load_cards(path, cache=Cache(tmp_path, {})))
+        )
+
+    def test_renamed_deck_keeps_cache(self, tmp_path, monkeypatch):
+        path = pathlib.Path("sample/Biology")
+        settings = {"deck_id": 1, "deck_name": "Biology"}
+        (cards, image_paths) = load_cards(path, cache=Cache(tmp_path, settings))
+
+        def parse_texts(texts, **kwargs):
+            assert [] == texts, "files were parsed"
+            return []
+
+        monkeypatch.setattr(generator, "parse_texts", parse_texts)
+        renamed = {"deck_id": 2, "deck_name": "Cells"}
+
+        assert (sorted(cards), sorted(image_paths)) == tuple(
+            map(sorted, load_cards(path, cache=Cache(tmp_path, renamed)))
+        )
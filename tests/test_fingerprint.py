@@ -0,0 +1,46 @@
+import os
+
+from ankivalenz.fingerprint import Fingerprint, input_digest, latest_mtime, stat_files
+
+
+class TestStatFiles:
+    def test_stats(self, tmp_path):
+        path = tmp_path / "a.md"
+        path.write_text("abc")
+        os.utime(path, ns=(0, 5 * 10**9))
+
+        assert {str(path): [5 * 10**9, 3], str(tmp_path / "b.md"): None} == (
+            stat_files([path, tmp_path / "b.md"])
+        )
+
+
+class TestInputDigest:
+    def test_depends_on_inputs(self):
+        digest = input_digest({"a": 1}, {"writer": "native"}, {"a.md": [1, 1]})
+
+        assert digest == input_digest({"a": 1}, {"writer": "native"}, {"a.md": [1, 1]})
+        assert digest != input_digest({"a": 2}, {"writer": "native"}, {"a.md": [1, 1]})
+        assert digest != input_digest({"a": 1}, {"writer": "genanki"}, {"a.md": [1, 1]})
+        assert digest != input_digest({"a": 1}, {"writer": "native"}, {"a.md": [2, 1]})
+        assert digest != input_digest({"a": 1}, {"writer": "native"}, {"a.md": None})
+
+
+class TestLatestMtime:
+    def test_latest_mtime(self):
+        assert 3 == latest_mtime(
+            {"a": [1 * 10**9, 1], "b": [3 * 10**9 + 5, 1], "c": None}
+        )
+
+    def test_no_files(self):
+        assert 0 == latest_mtime({})
+
+
+class TestFingerprint:
+    def test_save_and_load(self, tmp_path):
+        Fingerprint("digest", ["images/a.png"]).save(tmp_path)
+        fingerprint = Fingerprint.load(tmp_path)
+
+        assert ("digest", ["images/a.png"]) == (fingerprint.digest, fingerprint.media)
+
+    def test_load_missing(self, tmp_path):
+        assert None == Fingerprint.load(tmp_path).digest
@@ -1,15 +1,23 @@
-from datetime import datetime, timezone
 import json
 import pathlib
+from ankivalenz import generator
 from ankivalenz.generator import (
+    Note,
+    cards_to_notes,
+    delta_package,
+    iter_cards,
+    iter_notes,
     package,
     load_cards,
+    referenced_media,
 )
 from ankivalenz.anki_models import (
     BASIC_MODEL,
     BASIC_AND_REVERSED_CARD_MODEL,
     CLOZE_MODEL,
 )
+from ankivalenz.manifest import note_tag
+from ankivalenz.timings import Timings
 from ankivalenz.types import BasicCard, ClozeCard
 
 
@@ -122,10 +130,92 @@ class TestLoadCards:
         ) == sorted(cards)
 
 
+class TestLoadCardsWithTokenParser:
+    def test_same_cards(self):
+        path = pathlib.Path("sample/Biology")
+
+        assert load_cards(path) == load_cards(path, options={"parser": "tokens"})
+
+
+class TestLoadCardsInParallel:
+    def test_same_cards_in_same_order(self):
+        path = pathlib.Path("sample/Biology")
+
+        assert load_cards(path) == load_cards(path, jobs=2)
+
+
+class TestLoadCardsSource:
+    def test_sets_source(self):
+        (cards, _) = load_cards(pathlib.Path("sample/Biology"))
+
+        assert "Animals/Mouse.md" in {card.source for card in cards}
+
+
+class TestIterCards:
+    def test_same_cards(self):
+        path = pathlib.Path("sample/Biology")
+
+        assert load_cards(path)[0] == list(iter_cards(path))
+
+    def test_same_cards_in_parallel(self):
+        path = pathlib.Path("sample/Biology")
+
+        assert load_cards(path)[0] == list(iter_cards(path, jobs=2))
+
+    def test_parses_files_lazily(self, monkeypatch):
+        parsed = []
+        parse_texts = generator.parse_texts
+
+        def counting_parse_texts(texts, **kwargs):
+            parsed.extend(texts)
+            return parse_texts(texts, **kwargs)
+
+        monkeypatch.setattr(generator, "parse_texts", counting_parse_texts)
+
+        next(iter_cards(pathlib.Path("sample/Biology")))
+
+        assert 1 == len(parsed)
+
+
+class TestIterNotes:
+    def test_same_notes(self):
+        (cards, _) = load_cards(pathlib.Path("sample/Biology"))
+        assert [n.guid for n in cards_to_notes(cards)] == [
+            n.guid for n in iter_notes(iter(cards))
+        ]
+
+
+class TestCardsToNotes:
+    def guid(self, card):
+        return cards_to_notes([card])[0].guid
+
+    def test_guid_ignores_answer(self):
+        assert self.guid(BasicCard("Q", "A", ["P"], source="a.md")) == self.guid(
+            BasicCard("Q", "B", ["P"], source="a.md")
+        )
+
+    def test_guid_depends_on_identity(self):
+        guid = self.guid(BasicCard("Q", "A", ["P"], source="a.md"))
+
+        assert guid != self.guid(BasicCard("Q", "A", ["P"], source="b.md"))
+        assert guid != self.guid(BasicCard("Q", "A", ["R"], source="a.md"))
+        assert guid != self.guid(BasicCard("R", "A", ["P"], source="a.md"))
+
+    def test_guid_from_explicit_id(self):
+        assert self.guid(BasicCard("Q", "A", ["P"], id="q")) == self.guid(
+            ClozeCard("{{c1::Q}}", ["R"], id="q")
+        )
+
+    def test_duplicates_get_distinct_guids(self):
+        card = BasicCard("Q", "A", ["P"], source="a.md")
+        notes = cards_to_notes([card, card])
+
+        assert notes[0].guid != notes[1].guid
+
+
 class TestPackage:
     def setup_method(self):
-        self.time = datetime.fromtimestamp(12345, tz=timezone.utc)
-        self.package = package(pathlib.Path("sample/Biology"), time=self.time)
+        self.package = package(pathlib.Path("sample/Biology"))
         self.deck = self.package.decks[0]
 
     def test_deck_id(self):
@@ -149,4 +239,193 @@ class TestPackage:
         assert sorted(paths) == sorted(media_files)
 
     def test_tag(self):
-        assert "ankivalenz:updated:12345" == self.deck.notes[0].tags[0]
+        note = self.deck.notes[0]
+
+        assert [note_tag(note.guid)] == note.tags
+
+
+class TestDeltaPackage:
+    def setup_method(self):
+        self.package = package(pathlib.Path("sample/Biology"))
+
+    def test_only_notes_with_guids(self):
+        notes = self.package.decks[0].notes[:2]
+
+        delta = delta_package(self.package, {note.guid for note in notes})
+
+        assert notes == delta.decks[0].notes
+        assert self.package.decks[0].deck_id == delta.decks[0].deck_id
+
+    def test_only_referenced_media(self):
+        notes = [
+            note
+            for note in self.package.decks[0].notes
+            if "flagella.png" in note.fields[1]
+        ]
+
+        delta = delta_package(self.package, {note.guid for note in notes})
+
+        assert ["flagella.png"] == [pathlib.Path(p).name for p in delta.media_files]
+
+    def test_empty(self):
+        delta = delta_package(self.package, set())
+
+        assert ([], []) == (delta.decks[0].notes, delta.media_files)
+
+
+class TestReferencedMedia:
+    def test_unquotes_names(self):
+        notes = [
+            Note(
+                model=BASIC_MODEL,
+                fields=[
+                    '<img alt="A" src="a%20b.png"/>',
+                    '<img src="c&amp;d.png"/>',
+                    "",
+                ],
+            )
+        ]
+
+        assert {"a b.png", "c&d.png"} == referenced_media(notes)
+
+
+SPLIT_TEXT = """# Chapter ![icon](images/icon.png)
+
+- Q1 ?:: A1
+
+## Section
+
+- Q2 ?:: ![a](images/a.png)
+
+# Other
+
+- Q3 ?:: A3
+"""
+
+
+class TestParseTextsInParts:
+    def test_same_cards(self):
+        assert generator.parse_texts([SPLIT_TEXT]) == generator.parse_texts(
+            [SPLIT_TEXT], split_size=1
+        )
+
+    def test_same_cards_in_parallel(self):
+        assert (
+            generator.parse_texts([SPLIT_TEXT])
+            == generator.parse_texts([SPLIT_TEXT, SPLIT_TEXT], jobs=2, split_size=1)[:1]
+        )
+
+    def test_prefix_image_count(self):
+        assert 0 == generator.prefix_image_count("# Chapter\n## Section\n")
+        assert 1 == generator.prefix_image_count("# Chapter ![icon](icon.png)\n")
+        assert 1 == generator.prefix_image_count('# Chapter <img src="icon.png">\n')
+        assert 0 == generator.prefix_image_count("# Chapter `![icon](icon.png)`\n")
+
+    def test_paths(self):
+        [(cards, image_paths)] = generator.parse_texts([SPLIT_TEXT], split_size=1)
+
+        assert ["images/icon.png", "images/a.png"] == image_paths
+        assert [
+            ('Chapter <img alt="icon" src="icon.png"/>',),
+            ('Chapter <img alt="icon" src="icon.png"/>', "Section"),
+            ("Other",),
+        ] == [card.path for card in cards]
+
+    def test_parse_time_per_text(self):
+        timings = Timings()
+
+        generator.parse_texts([SPLIT_TEXT, "Q ?:: A"], timings=timings, split_size=1)
+
+        assert 2 == len(timings.parse_times)
+
+    def test_load_cards(self):
+        path = pathlib.Path("sample/Biology")
+
+        assert load_cards(path) == load_cards(path, split_size=1)
+
+
+class TestPackageInputFiles:
+    def test_exclude_and_input_extensions(self, tmp_path):
+        (tmp_path / "ankivalenz.json").write_text(
+            json.dumps(
+                {
+                    "deck_id": 1,
+                    "deck_name": "Deck",
+                    "input_ext": ["md", "markdown"],
+                    "exclude": ["drafts/"],
+                }
+            )
+        )
+        (tmp_path / ".ankivalenzignore").write_text("*.tmp.md\n")
+        (tmp_path / "drafts").mkdir()
+        (tmp_path / "a.md").write_text("- A ?:: 1")
+        (tmp_path / "b.markdown").write_text("- B ?:: 2")
+        (tmp_path / "c.tmp.md").write_text("- C ?:: 3")
+        (tmp_path / "drafts" / "d.md").write_text("- D ?:: 4")
+
+        deck = package(tmp_path).decks[0]
+
+        assert ["A", "B"] == [note.fields[0] for note in deck.notes]
+
+
+class TestLoadCardsMixedFormats:
+    def test_parses_html_files_as_html(self, tmp_path):
+        (tmp_path / "a.md").write_text("- A ?:: 1")
+        (tmp_path / "b.html").write_text("<ul><li>B ?:: 2 <b>bold</b></li></ul>")
+        (tmp_path / "c.htm").write_text("<style>p::before {}</style><p>C ?:: 3</p>")
+
+        (cards, _) = load_cards(tmp_path, extension=["md", "html", "htm"])
+
+        assert [
+            ("a.md", "A", "1"),
+            ("b.html", "B", "2 <b>bold</b>"),
+            ("c.htm", "C", "3"),
+        ] == [(card.source, card.question, card.answer) for card in cards]
+
+    def test_cache_depends_on_format(self, tmp_path):
+        from ankivalenz.cache import Cache
+
+        (tmp_path / "a.md").write_text("A ?:: **1**")
+        (tmp_path / "a.html").write_text("A ?:: **1**")
+        cache = Cache(tmp_path, {})
+
+        (cards, _) = load_cards(tmp_path, extension=["md", "html"], cache=cache)
+
+        assert ["**1**", "<strong>1</strong>"] == [card.answer for card in cards]
+
+
+class TestPackageWithStore:
+    def notes(self, deck):
+        return [(note.guid, note.fields, note.tags, note.source) for note in deck.notes]
+
+    def test_same_notes(self):
+        from ankivalenz.manifest import Manifest
+        from ankivalenz.spill import CardStore
+
+        path = pathlib.Path("sample/Biology")
+        manifest = Manifest()
+        spilled_manifest = Manifest()
+        deck = package(path, manifest=manifest).decks[0]
+
+        with CardStore() as store:
+            spilled = package(path, manifest=spilled_manifest, store=store)
+            spilled_deck = spilled.decks[0]
+
+            assert self.notes(deck) == self.notes(spilled_deck)
+            assert len(deck.notes) == len(spilled_deck.notes)
+
+        assert manifest.notes == spilled_manifest.notes
+
+    def test_duplicate_cards(self, tmp_path):
+        from ankivalenz.spill import CardStore
+
+        (tmp_path / "ankivalenz.json").write_text(
+            json.dumps({"deck_id": 1, "deck_name": "Deck"})
+        )
+        (tmp_path / "a.md").write_text("- A ?:: 1\n- A ?:: 1\n- B ?:: 2\n- A ?:: 1\n")
+        deck = package(tmp_path).decks[0]
+
+        with CardStore() as store:
+            spilled_deck = package(tmp_path, store=store).decks[0]
+
+            assert self.notes(deck) == self.notes(spilled_deck)
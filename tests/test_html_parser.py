@@ -0,0 +1,129 @@
+from bs4 import BeautifulSoup, FeatureNotFound, Tag
+import pytest
+
+from ankivalenz import html_parser
+from ankivalenz.html_parser import HtmlParser, available_backend, serialize
+from ankivalenz.types import Delimeter
+
+
+def headings(count: int) -> str:
+    return "\n".join(
+        "<h2>Header {}</h2>\n<ul>\n<li>Q{} ?:: A{}</li>\n</ul>".format(i, i, i)
+        for i in range(count)
+    )
+
+
+class TestSections:
+    def test_content_before_header(self):
+        html = "<p>A ?:: B</p>\n<h1>Header</h1>\n<p>C ?:: D</p>"
+
+        (nodes, _) = HtmlParser().parse(html)
+
+        assert [
+            ("A", Delimeter("?::"), "B"),
+            ("Header", [("C", Delimeter("?::"), "D")]),
+        ] == nodes
+
+    def test_sibling_and_nested_headers(self):
+        html = "<h1>A</h1><h2>B</h2><h3>C</h3><h2>D</h2><h1>E</h1><h3>F</h3>"
+
+        (nodes, _) = HtmlParser().parse(html)
+
+        assert [
+            ("A", [("B", [("C", [])]), ("D", [])]),
+            ("E", [("F", [])]),
+        ] == nodes
+
+
+class TestManyHeadings:
+    def test_parses_10k_headings(self):
+        (nodes, _) = HtmlParser().parse(headings(10_000))
+
+        assert 10_000 == len(nodes)
+        assert ("Header 9999", [("Q9999", Delimeter("?::"), "A9999")]) == nodes[-1]
+
+
+class TestBackend:
+    def setup_method(self):
+        available_backend.cache_clear()
+
+    def teardown_method(self):
+        available_backend.cache_clear()
+
+    def test_falls_back_to_html_parser(self, monkeypatch):
+        def beautiful_soup(markup, backend):
+            raise FeatureNotFound()
+
+        monkeypatch.setattr(html_parser, "BeautifulSoup", beautiful_soup)
+
+        with pytest.warns(UserWarning):
+            assert "html.parser" == available_backend("lxml")
+
+    def test_unwraps_body(self):
+        pytest.importorskip("lxml")
+
+        html = "<h1>Header</h1>\n<p>A ?:: B</p>"
+
+        assert HtmlParser().parse(html) == HtmlParser("lxml").parse(html)
+
+
+def nested_lists(depth: int) -> str:
+    return (
+        "<ul><li>Header\n" * depth + "<ul><li>Q ?:: A</li></ul>" + "</li></ul>" * depth
+    )
+
+
+class TestDeepNesting:
+    def test_parses_5k_nested_lists(self):
+        (nodes, _) = HtmlParser().parse(nested_lists(5_000))
+
+        for _ in range(5_000):
+            assert 1 == len(nodes)
+            (header, nodes) = nodes[0]
+            assert "Header" == header
+
+        assert [("Q", Delimeter("?::"), "A")] == nodes
+
+    def test_parses_20k_sibling_headings(self):
+        (nodes, _) = HtmlParser().parse(headings(20_000))
+
+        assert 20_000 == len(nodes)
+        assert ("Header 0", [("Q0", Delimeter("?::"), "A0")]) == nodes[0]
+        assert ("Header 19999", [("Q19999", Delimeter("?::"), "A19999")]) == nodes[-1]
+
+    def test_strips_nested_image_paths(self):
+        html = "<div>" * 5_000 + '<img src="images/a%20b.png">' + "</div>" * 5_000
+        soup = BeautifulSoup(html, "html.parser")
+
+        assert ["images/a b.png"] == HtmlParser().strip_image_paths(soup.contents)
+        assert "a%20b.png" == soup.find("img")["src"]
+
+
+SERIALIZE_HTML = [
+    "Text &amp; <b>bold &lt;tag&gt;</b> more",
+    "<p class='a b' id=\"x\">Q ?:: A</p>",
+    "<img src='a%20b.png' alt=\"it's\"><br><hr/><input disabled>",
+    "<a href='?a=1&b=2' title='\"x\"'>link</a>",
+    "<span title=\"&quot;x&quot; 'y'\">t</span>",
+    "<!-- comment --><script>1 < 2 && 3 > 2</script><style>a > b {}</style>",
+    "<pre>\n  code\n</pre><code>&lt;T&gt;</code><p></p>",
+    "<math><mi>x</mi></math><svg:rect x=1/>",
+]
+
+
+class TestSerialize:
+    @pytest.mark.parametrize("backend", ["html.parser", "lxml", "html5lib"])
+    @pytest.mark.parametrize("html", SERIALIZE_HTML)
+    def test_same_as_str(self, backend, html):
+        pytest.importorskip(backend.split(".")[0])
+        soup = BeautifulSoup(html, backend)
+
+        for element in [soup, *soup.descendants]:
+            if isinstance(element, Tag):
+                contents = element.contents
+
+                assert "".join(map(str, contents)) == serialize(contents)
+                assert "".join(map(str, contents[1:])) == serialize(contents[1:])
+
+                if element is not soup:
+                    assert str(element) == serialize([element])
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from ankivalenz.lexer import BASIC, CLOZE, PLAIN, STANDALONE, Lexer, get_lexer
+from ankivalenz.types import Delimeter
+
+
+class TestLex:
+    def test_plain(self):
+        assert (PLAIN, "Sun", None, "") == Lexer().lex("Sun")
+
+    def test_basic(self):
+        assert (BASIC, "Sun", Delimeter("?::"), "Yellow") == Lexer().lex(
+            "Sun ?:: Yellow"
+        )
+
+    def test_first_delimiter(self):
+        assert (BASIC, "A", Delimeter("::"), "B ?:: C") == Lexer().lex("A :: B ?:: C")
+
+    def test_longest_delimiter(self):
+        assert (BASIC, "A", Delimeter("::?"), "B") == Lexer().lex("A ::? B")
+
+    def test_standalone(self):
+        assert (STANDALONE, "", Delimeter("::?"), "Question") == Lexer().lex(
+            "::? Question"
+        )
+
+    def test_leading_whitespace_is_not_standalone(self):
+        assert (BASIC, "", Delimeter("::"), "B") == Lexer().lex(" :: B")
+
+    def test_cloze(self):
+        assert (CLOZE, "The {{c1::sun}}", None, "") == Lexer().lex("The {{c1::sun}}")
+
+    def test_cloze_after_delimiter(self):
+        assert CLOZE == Lexer().lex("A :: {{c12::B}}")[0]
+
+
+class TestDelimiters:
+    def test_custom(self):
+        lexer = Lexer({"front_back": "->", "back_front": "<-"})
+
+        assert (BASIC, "Sun", Delimeter("?::"), "Yellow") == lexer.lex("Sun -> Yellow")
+        assert (BASIC, "Yellow", Delimeter("::?"), "Sun") == lexer.lex("Yellow <- Sun")
+        assert (BASIC, "A", Delimeter("::"), "B") == lexer.lex("A :: B")
+        assert (BASIC, "Sun ?", Delimeter("::"), "Yellow") == lexer.lex(
+            "Sun ?:: Yellow"
+        )
+
+    def test_regexp_characters(self):
+        lexer = Lexer({"two_way": ".*"})
+
+        assert (BASIC, "A", Delimeter("::"), "B") == lexer.lex("A .* B")
+        assert PLAIN == lexer.lex("AB")[0]
+
+    def test_unknown_kind(self):
+        with pytest.raises(ValueError):
+            Lexer({"unknown": "=>"})
+
+    def test_empty(self):
+        with pytest.raises(ValueError):
+            Lexer({"two_way": ""})
+
+    def test_whitespace(self):
+        with pytest.raises(ValueError):
+            Lexer({"two_way": " = "})
+
+    def test_not_distinct(self):
+        with pytest.raises(ValueError):
+            Lexer({"two_way": "?::"})
+
+    def test_shared(self):
+        assert get_lexer({"two_way": "="}) is get_lexer({"two_way": "="})
+
+
+class TestLinearTime:
+    # The previous regular expressions took seconds for a long run of
+    # whitespace without a delimiter.
+    def test_long_whitespace(self):
+        text = "a" + " " * 50000 + "b"
+
+        start = time.perf_counter()
+        Lexer().lex(text)
+
+        assert time.perf_counter() - start < 0.5
@@ -0,0 +1,233 @@
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+from typer.testing import CliRunner
+
+import ankivalenz
+from ankivalenz import generator, markdown_parser
+
+
+def imported_modules(statement: str) -> set:
+    code = "import sys\n{}\nprint(' '.join(sys.modules))".format(statement)
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+
+    return set(output.split())
+
+
+class TestLazyImports:
+    @pytest.mark.parametrize(
+        "statement", ["import ankivalenz", "import ankivalenz.main"]
+    )
+    def test_no_heavy_imports(self, statement):
+        modules = imported_modules(statement)
+
+        for name in ["genanki", "bs4", "markdown_it", "ankivalenz.generator"]:
+            assert name not in modules
+
+    def test_lazy_attributes(self):
+        assert generator.package is ankivalenz.package
+        assert markdown_parser.MarkdownParser is ankivalenz.MarkdownParser
+
+    def test_unknown_attribute(self):
+        with pytest.raises(AttributeError):
+            ankivalenz.missing
+
+
+class TestRun:
+    @pytest.fixture
+    def vault(self, tmp_path, monkeypatch):
+        # Packages are written to the working directory.
+        monkeypatch.chdir(tmp_path)
+
+        vault = tmp_path / "vault"
+        (vault / "images").mkdir(parents=True)
+        (vault / "images" / "a.png").write_bytes(b"png")
+        (vault / "ankivalenz.json").write_text(
+            json.dumps({"deck_id": 1, "deck_name": "Vault"})
+        )
+        (vault / "Cell.md").write_text("- Nucleus ?:: ![A](images/a.png)\n")
+
+        return vault
+
+    def run(self, *args):
+        from ankivalenz.main import app
+
+        result = CliRunner().invoke(app, ["run", "vault", *args])
+        assert 0 == result.exit_code, result.output
+
+        return result.output
+
+    @pytest.mark.parametrize("writer", ["genanki", "native"])
+    def test_same_package(self, vault, tmp_path, writer):
+        self.run("--writer", writer)
+        first = (tmp_path / "Vault.apkg").read_bytes()
+
+        self.run("--writer", writer, "--force")
+
+        assert first == (tmp_path / "Vault.apkg").read_bytes()
+
+    @pytest.mark.parametrize("writer", ["genanki", "native"])
+    def test_spill(self, vault, tmp_path, writer):
+        self.run("--writer", writer)
+        first = (tmp_path / "Vault.apkg").read_bytes()
+
+        self.run("--writer", writer, "--force", "--spill")
+
+        assert first == (tmp_path / "Vault.apkg").read_bytes()
+
+    def test_up_to_date(self, vault, tmp_path):
+        self.run()
+        mtime = (tmp_path / "Vault.apkg").stat().st_mtime_ns
+
+        assert "- Vault.apkg is up to date\n" == self.run()
+        assert mtime == (tmp_path / "Vault.apkg").stat().st_mtime_ns
+
+    def test_report_when_up_to_date(self, vault, tmp_path):
+        self.run()
+        self.run("--report", "report.json", "--removed", "removed.json")
+
+        report = json.loads((tmp_path / "report.json").read_text())
+
+        assert ["check", "total"] == sorted(report["stages"])
+        assert [] == json.loads((tmp_path / "removed.json").read_text())
+
+    def test_removed(self, vault, tmp_path):
+        self.run()
+        (vault / "Cell.md").write_text("- Center ?:: Nucleus\n")
+
+        output = self.run("--removed", "removed.json")
+        [entry] = json.loads((tmp_path / "removed.json").read_text())
+
+        assert "Cell.md" == entry["source"]
+        assert "tag:{}".format(entry["tag"]) in output
+
+    def test_rebuilds_on_changes(self, vault, tmp_path):
+        self.run()
+
+        (vault / "Cell.md").write_text("- Center ?:: ![A](images/a.png)\n")
+        os.utime(vault / "Cell.md", ns=(0, 0))
+        assert "up to date" not in self.run()
+
+        (vault / "images" / "a.png").write_bytes(b"png2")
+        assert "up to date" not in self.run()
+
+        (vault / "Sun.md").write_text("- Sun ?:: Star\n")
+        assert "up to date" not in self.run()
+
+        (tmp_path / "Vault.apkg").unlink()
+        assert "up to date" not in self.run()
+
+        assert "up to date" not in self.run("--writer", "native")
+
+    def test_rebuilds_on_changes_during_build(self, vault, tmp_path, monkeypatch):
+        parse_texts = generator.parse_texts
+
+        def edit_while_parsing(texts, **kwargs):
+            (vault / "Cell.md").write_text("- Center of the cell ?:: Nucleus\n")
+            return parse_texts(texts, **kwargs)
+
+        monkeypatch.setattr(generator, "parse_texts", edit_while_parsing)
+        self.run("--no-cache")
+        monkeypatch.setattr(generator, "parse_texts", parse_texts)
+
+        assert "up to date" not in self.run()
+
+
+class TestWatch:
+    @pytest.fixture
+    def vault(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+
+        vault = tmp_path / "vault"
+        (vault / "notes").mkdir(parents=True)
+        (vault / "ankivalenz.json").write_text(
+            json.dumps({"deck_id": 1, "deck_name": "Vault"})
+        )
+        (vault / "notes" / "Cell.md").write_text("- Nucleus ?:: Center\n")
+
+        return vault
+
+    # Runs `ankivalenz watch`, making each of `edits` in turn instead of
+    # waiting for changes, and returns the output and the watched paths.
+    def watch(self, monkeypatch, edits):
+        from ankivalenz import watch
+        from ankivalenz.main import app
+
+        edits = list(edits)
+        watched = []
+
+        def create_watcher(path, extensions, ignore=None):
+            watched.append(path)
+            return watch.FileWatcher([])
+
+        def wait_for_changes(watcher, interval=0.5):
+            if not edits:
+                raise KeyboardInterrupt()
+
+            return edits.pop(0)()
+
+        monkeypatch.setattr(watch, "create_watcher", create_watcher)
+        monkeypatch.setattr(watch, "wait_for_changes", wait_for_changes)
+
+        result = CliRunner().invoke(app, ["watch", "vault"])
+        assert 0 == result.exit_code, result.output
+
+        return (result.output, watched)
+
+    def test_keeps_watching_after_errors(self, vault, tmp_path, monkeypatch):
+        note = vault / "notes" / "Cell.md"
+
+        def break_note():
+            note.write_text("- Nucleus ?:: ![A](missing.png)\n")
+            return {note}
+
+        def fix_note():
+            note.write_text("- Nucleus ?:: Center\n")
+            return {note}
+
+        (output, _) = self.watch(monkeypatch, [break_note, fix_note])
+
+        assert "- Build failed: FileNotFoundError" in output
+        assert output.endswith(
+            "- Added 1 notes to deck Vault in Vault.apkg\n"
+            "- Added 0 media files (0.0 MiB)\n"
+            "- 0 notes added, 0 changed and 0 removed since the last build\n"
+            "- Import the .apkg file into Anki (File -> Import)\n"
+        )
+
+    def test_same_package_as_run(self, vault, tmp_path, monkeypatch):
+        from ankivalenz.main import app
+
+        self.watch(monkeypatch, [])
+        package = (tmp_path / "Vault.apkg").read_bytes()
+
+        # The build is recorded, so `run` has nothing to do.
+        result = CliRunner().invoke(app, ["run", "vault"])
+        assert "- Vault.apkg is up to date\n" == result.output
+
+        CliRunner().invoke(app, ["run", "vault", "--force"])
+        assert package == (tmp_path / "Vault.apkg").read_bytes()
+
+    def test_reloads_settings(self, vault, tmp_path, monkeypatch):
+        settings_path = pathlib.Path("vault") / "ankivalenz.json"
+
+        def break_settings():
+            settings_path.write_text("{")
+            return {settings_path}
+
+        def change_input_path():
+            settings_path.write_text(
+                json.dumps({"deck_id": 1, "deck_name": "Vault", "input_path": "notes"})
+            )
+            return {settings_path}
+
+        (output, watched) = self.watch(monkeypatch, [break_settings, change_input_path])
+
+        assert "- Could not load the settings: JSONDecodeError" in output
+        assert [pathlib.Path("vault"), pathlib.Path("vault/notes")] == watched
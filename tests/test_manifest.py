@@ -0,0 +1,111 @@
+import json
+import pathlib
+
+from ankivalenz.anki_models import BASIC_MODEL
+from ankivalenz.generator import Note, package
+from ankivalenz.manifest import (
+    MANIFEST_PATH,
+    Manifest,
+    note_hash,
+    note_tag,
+    search_for,
+)
+
+
+def note(guid, answer):
+    return Note(model=BASIC_MODEL, fields=["Q", answer, ""], guid=guid)
+
+
+class TestNoteHash:
+    def test_same_content(self):
+        assert note_hash(note("a", "A")) == note_hash(note("b", "A"))
+
+    def test_different_content(self):
+        assert note_hash(note("a", "A")) != note_hash(note("a", "B"))
+
+
+class TestNoteTag:
+    def test_stable(self):
+        assert note_tag("a") == note_tag("a")
+        assert note_tag("a") != note_tag("b")
+        assert " " not in note_tag("a")
+        assert "::" not in note_tag("a")
+
+
+class TestSearchFor:
+    def test_search(self):
+        assert 'deck:"Biology" (tag:{} OR tag:{})'.format(
+            note_tag("a"), note_tag("b")
+        ) == search_for("Biology", ["a", "b"])
+
+
+class TestManifest:
+    def test_diff(self):
+        previous = Manifest()
+        previous.add(note("same", "A"), "a.md")
+        previous.add(note("changed", "A"), "a.md")
+        previous.add(note("removed", "A"), "b.md")
+
+        current = Manifest()
+        current.add(note("same", "A"), "a.md")
+        current.add(note("changed", "B"), "a.md")
+        current.add(note("added", "A"), "a.md")
+
+        assert ["added"] == current.added(previous)
+        assert ["changed"] == current.changed(previous)
+        assert ["removed"] == current.removed(previous)
+
+    def test_compare(self, tmp_path):
+        previous = Manifest()
+        previous.add(note("same", "A"), "a.md")
+        previous.add(note("changed", "A"), "a.md")
+        previous.add(note("removed", "A"), "b.md")
+        previous.save(tmp_path)
+
+        current = Manifest()
+        current.add(note("same", "A"), "a.md")
+        current.add(note("changed", "B"), "a.md")
+        current.add(note("added", "A"), "a.md")
+
+        assert (
+            ["added"],
+            ["changed"],
+            {"removed": previous.notes["removed"]},
+        ) == current.compare(tmp_path)
+
+    def test_line_per_note(self, tmp_path):
+        manifest = Manifest()
+        manifest.add(note("b", "B"), "b.md")
+        manifest.add(note("a", "A"), "a.md")
+        manifest.save(tmp_path)
+
+        lines = (tmp_path / MANIFEST_PATH).read_text().splitlines()
+
+        assert ["a", "b"] == [json.loads(line)["guid"] for line in lines]
+
+    def test_save_and_load(self, tmp_path):
+        manifest = Manifest()
+        manifest.add(note("a", "A"), "a.md")
+        manifest.save(tmp_path)
+
+        assert manifest.notes == Manifest.load(tmp_path).notes
+
+    def test_load_missing(self, tmp_path):
+        assert {} == Manifest.load(tmp_path).notes
+
+
+class TestPackageManifest:
+    def test_adds_every_note(self):
+        manifest = Manifest()
+        apkg = package(pathlib.Path("sample/Biology"), manifest=manifest)
+
+        assert {n.guid for n in apkg.decks[0].notes} == set(manifest.notes)
+        assert "Animals/Mouse.md" in {e["source"] for e in manifest.notes.values()}
+
+    def test_unchanged_between_builds(self):
+        (a, b) = (Manifest(), Manifest())
+        package(pathlib.Path("sample/Biology"), manifest=a)
+        package(pathlib.Path("sample/Biology"), manifest=b)
+
+        assert a.notes == b.notes
+        assert [] == b.changed(a)
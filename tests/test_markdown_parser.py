@@ -1,11 +1,32 @@
 import textwrap
 
+import pytest
+
 from ankivalenz import MarkdownParser
 from ankivalenz.types import Delimeter
 
 
+# Run every test against both engines and all HTML backends, to make sure
+# they produce the same nodes.
+@pytest.fixture(
+    params=[
+        ("html", "html.parser"),
+        ("html", "lxml"),
+        ("html", "html5lib"),
+        ("tokens", "html.parser"),
+    ]
+)
+def parser(request):
+    (engine, html_backend) = request.param
+
+    if html_backend != "html.parser":
+        pytest.importorskip(html_backend)
+
+    return MarkdownParser(engine, html_backend=html_backend)
+
+
 class TestHeaders:
-    def test_nested_headers(self):
+    def test_nested_headers(self, parser):
         md = textwrap.dedent("""
             # Header A-1
 
@@ -14,7 +35,7 @@ class TestHeaders:
             # Header B-1
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             (
@@ -24,25 +45,25 @@ class TestHeaders:
             ("Header B-1", []),
         ] == nodes
 
-    def test_header_with_markup(self):
+    def test_header_with_markup(self, parser):
         md = textwrap.dedent("""
             # Header *A*
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [("Header <em>A</em>", [])] == nodes
 
 
 class TestList:
-    def test_list(self):
+    def test_list(self, parser):
         md = textwrap.dedent("""
             - A :: B
             - C ?:: D
             - E ::? F
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             ("A", Delimeter("::"), "B"),
@@ -50,49 +71,49 @@ class TestList:
             ("E", Delimeter("::?"), "F"),
         ] == nodes
 
-    def test_list_with_markup(self):
+    def test_list_with_markup(self, parser):
         md = textwrap.dedent("""
             - A *italic* :: B **strong**
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             ("A <em>italic</em>", Delimeter("::"), "B <strong>strong</strong>")
         ] == nodes
 
-    def test_list_with_cloze(self):
+    def test_list_with_cloze(self, parser):
         md = textwrap.dedent("""
             - Cloze {{c1::deletion}}
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [("Cloze {{c1::deletion}}")] == nodes
 
-    def test_list_with_cloze_and_image_after_cloze(self):
+    def test_list_with_cloze_and_image_after_cloze(self, parser):
         md = textwrap.dedent("""
             - Cloze {{c1::deletion}}  
               ![](image.png)
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert ['Cloze {{c1::deletion}}<br/>\n<img alt="" src="image.png"/>'] == nodes
 
-    def test_list_with_cloze_and_image_before_cloze(self):
+    def test_list_with_cloze_and_image_before_cloze(self, parser):
         md = textwrap.dedent("""
             - ![](image.png)  
               Cloze {{c1::deletion}}
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert ['<img alt="" src="image.png"/><br/>Cloze {{c1::deletion}}'] == nodes
 
 
 class TestHeadersAndList:
-    def test_header_and_list(self):
+    def test_header_and_list(self, parser):
         md = textwrap.dedent("""
             # Header 1
 
@@ -101,13 +122,13 @@ class TestHeadersAndList:
             - Question ?:: Answer
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             ("Header 1", [("Header 2", [("Question", Delimeter("?::"), "Answer")])])
         ] == nodes
 
-    def test_header_and_list_with_multiple_items(self):
+    def test_header_and_list_with_multiple_items(self, parser):
         md = textwrap.dedent("""
             # Header 1
 
@@ -120,7 +141,7 @@ class TestHeadersAndList:
               - Question 2 ?:: Answer 2
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             (
@@ -137,7 +158,7 @@ class TestHeadersAndList:
             )
         ] == nodes
 
-    def test_headers_and_lists(self):
+    def test_headers_and_lists(self, parser):
         md = textwrap.dedent("""
             # Header 1
 
@@ -151,7 +172,7 @@ class TestHeadersAndList:
 
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             (
@@ -165,12 +186,12 @@ class TestHeadersAndList:
 
 
 class TestImages:
-    def test_parses_width(self):
+    def test_parses_width(self, parser):
         md = textwrap.dedent("""
             - Question ?:: Answer ![](bar.png){width="150"}
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             (
@@ -180,12 +201,12 @@ class TestImages:
             )
         ] == nodes
 
-    def test_parses_alt_text(self):
+    def test_parses_alt_text(self, parser):
         md = textwrap.dedent("""
             - Question ?:: Answer ![Alt text](bar.png)
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             (
@@ -195,24 +216,24 @@ class TestImages:
             )
         ] == nodes
 
-    def test_strips_path_from_image(self):
+    def test_strips_path_from_image(self, parser):
         md = textwrap.dedent("""
             - Question ?:: Answer ![](foo/bar.png)
             """)
 
-        (nodes, image_paths) = MarkdownParser().parse(md)
+        (nodes, image_paths) = parser.parse(md)
 
         assert [
             ("Question", Delimeter("?::"), 'Answer <img alt="" src="bar.png"/>')
         ] == nodes
         assert ["foo/bar.png"] == image_paths
 
-    def test_path_with_spaces(self):
+    def test_path_with_spaces(self, parser):
         md = textwrap.dedent("""
             - Question ?:: ![](foo%20bar.png)
             """)
 
-        (nodes, image_paths) = MarkdownParser().parse(md)
+        (nodes, image_paths) = parser.parse(md)
 
         assert [
             ("Question", Delimeter("?::"), '<img alt="" src="foo%20bar.png"/>')
@@ -221,17 +242,17 @@ class TestImages:
 
 
 class TestNestedList:
-    def test_nested_list(self):
+    def test_nested_list(self, parser):
         md = textwrap.dedent("""
             - A
               - B :: C
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [("A", [("B", Delimeter("::"), "C")])] == nodes
 
-    def test_multiple_nested_lists(self):
+    def test_multiple_nested_lists(self, parser):
         md = textwrap.dedent("""
             - List 1
               - Question 1 ?:: Answer 1
@@ -239,31 +260,31 @@ class TestNestedList:
               - Question 2 ?:: Answer 2
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             ("List 1", [("Question 1", Delimeter("?::"), "Answer 1")]),
             ("List 2", [("Question 2", Delimeter("?::"), "Answer 2")]),
         ] == nodes
 
-    def test_nested_list_and_standalone_answer(self):
+    def test_nested_list_and_standalone_answer(self, parser):
         md = textwrap.dedent("""
             - Question
               - ?:: Standalone answer
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [("Question", [(Delimeter("?::"), "Standalone answer")])] == nodes
 
-    def test_nested_list_and_standalone_answer_with_image(self):
+    def test_nested_list_and_standalone_answer_with_image(self, parser):
         md = textwrap.dedent("""
             - Question
               - ?:: Answer  
                 ![](image.png)
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             (
@@ -272,14 +293,14 @@ class TestNestedList:
             )
         ] == nodes
 
-    def test_nested_list_with_standalone_answer_with_empty_first_line(self):
+    def test_nested_list_with_standalone_answer_with_empty_first_line(self, parser):
         md = textwrap.dedent("""
             - Question
               - ?::
                 Answer
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             (
@@ -288,14 +309,14 @@ class TestNestedList:
             )
         ] == nodes
 
-    def test_nested_list_with_standalone_answer_with_empty_first_line_and_image(self):
+    def test_nested_list_with_standalone_answer_with_empty_first_line_and_image(self, parser):
         md = textwrap.dedent("""
             - Question
               - ?::
                 ![](image.png)
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             (
@@ -306,13 +327,81 @@ class TestNestedList:
 
 
 class TestMath:
-    def test_inline_math(self):
+    def test_inline_math(self, parser):
         md = textwrap.dedent("""
             - Question with $x^2$ :: Answer with $y^2$
             """)
 
-        (nodes, _) = MarkdownParser().parse(md)
+        (nodes, _) = parser.parse(md)
 
         assert [
             ("Question with \\(x^2\\)", Delimeter("::"), "Answer with \\(y^2\\)")
         ] == nodes
+
+
+class TestRawHtml:
+    def test_cloze_with_html(self, parser):
+        md = textwrap.dedent("""
+            - {{c1::<sup>14</sup>C}} is radioactive
+            """)
+
+        (nodes, _) = parser.parse(md)
+
+        assert ["{{c1::<sup>14</sup>C}} is radioactive"] == nodes
+
+    def test_code_block(self, parser):
+        md = textwrap.dedent("""
+            - Code ?:: Example
+
+            ```python
+            print("Example")
+            ```
+            """)
+
+        (nodes, _) = parser.parse(md)
+
+        assert [("Code", Delimeter("?::"), "Example")] == nodes
+
+
+class TestParseMany:
+    def test_parses_each_text(self, parser):
+        texts = ["- A :: B", "# Header"]
+
+        assert [parser.parse(text) for text in texts] == (
+            list(parser.parse_many(texts))
+        )
+
+    def test_shares_markdown_it(self, parser):
+        assert MarkdownParser().md is parser.md
+
+
+class TestParser:
+    def test_unknown_parser(self):
+        with pytest.raises(ValueError):
+            MarkdownParser("unknown")
+
+    def test_unknown_html_backend(self):
+        with pytest.raises(ValueError):
+            MarkdownParser(html_backend="unknown")
+
+
+class TestDelimiters:
+    def test_custom_delimiters(self):
+        parser = MarkdownParser(delimiters={"front_back": "=>", "two_way": "<=>"})
+        md = textwrap.dedent("""
+            - Color of the sun => Yellow
+            - Side 1 <=> Side 2
+            - Answer ::? Question
+            """)
+
+        (nodes, _) = parser.parse(md)
+
+        assert [
+            ("Color of the sun", Delimeter("?::"), "Yellow"),
+            ("Side 1", Delimeter("::"), "Side 2"),
+            ("Answer", Delimeter("::?"), "Question"),
+        ] == nodes
+
+    def test_invalid_delimiters(self):
+        with pytest.raises(ValueError):
+            MarkdownParser(delimiters={"two_way": ""})
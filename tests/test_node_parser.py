@@ -1,5 +1,10 @@
+import dataclasses
+import pickle
+
+import pytest
+
 from ankivalenz import BasicCard, NodeParser
-from ankivalenz.types import ClozeCard, Node, Delimeter, BasicCard
+from ankivalenz.types import BasicNode, ClozeCard, Node, Delimeter, BasicCard, PathNode
 
 
 class TestQuestionAnswer:
@@ -88,7 +93,7 @@ class TestNestedSingleLevel:
         assert 1 == len(self.cards)
 
     def test_path(self):
-        assert ["Header"] == self.cards[0].path
+        assert ("Header",) == self.cards[0].path
 
 
 class TestNestedMultipleLevels:
@@ -103,7 +108,7 @@ class TestNestedMultipleLevels:
         assert 1 == len(self.cards)
 
     def test_path(self):
-        assert ["Header 1", "Header 2"] == self.cards[0].path
+        assert ("Header 1", "Header 2") == self.cards[0].path
 
 
 class TestMultipleNestedLists:
@@ -119,8 +124,8 @@ class TestMultipleNestedLists:
         assert 2 == len(self.cards)
 
     def test_path(self):
-        assert ["List 1"] == self.cards[0].path
-        assert ["List 2"] == self.cards[1].path
+        assert ("List 1",) == self.cards[0].path
+        assert ("List 2",) == self.cards[1].path
 
 
 class TestNestedStandaloneQuestion:
@@ -139,7 +144,7 @@ class TestNestedStandaloneQuestion:
         assert "Answer" == self.cards[0].answer
 
     def test_path(self):
-        assert ["Header 1"] == self.cards[0].path
+        assert ("Header 1",) == self.cards[0].path
 
 
 class TestNestedStandaloneAnswer:
@@ -158,7 +163,7 @@ class TestNestedStandaloneAnswer:
         assert "Answer" == self.cards[0].answer
 
     def test_path(self):
-        assert ["Header 1"] == self.cards[0].path
+        assert ("Header 1",) == self.cards[0].path
 
 
 class TestNestedStandaloneTwoWay:
@@ -180,4 +185,99 @@ class TestNestedStandaloneTwoWay:
         assert True == self.cards[0].reverse
 
     def test_path(self):
-        assert ["Header 1"] == self.cards[0].path
+        assert ("Header 1",) == self.cards[0].path
+
+
+class TestExplicitId:
+    def test_basic_card(self):
+        nodes = [("Question", Delimeter("?::"), "Answer {#question-1}")]
+
+        cards = NodeParser().parse(nodes)
+
+        assert "Answer" == cards[0].answer
+        assert "question-1" == cards[0].id
+
+    def test_reversed_card(self):
+        nodes = [("Answer", Delimeter("::?"), "Question {#question-1}")]
+
+        cards = NodeParser().parse(nodes)
+
+        assert "Question" == cards[0].question
+        assert "question-1" == cards[0].id
+
+    def test_cloze_card(self):
+        nodes = ["A {{c1::Cloze}} Deletion {#cloze-1}"]
+
+        cards = NodeParser().parse(nodes)
+
+        assert "A {{c1::Cloze}} Deletion" == cards[0].question
+        assert "cloze-1" == cards[0].id
+
+    def test_no_id(self):
+        nodes = [("Question", Delimeter("?::"), "Answer {not an id}")]
+
+        cards = NodeParser().parse(nodes)
+
+        assert "Answer {not an id}" == cards[0].answer
+        assert None == cards[0].id
+
+
+class TestSharedPaths:
+    def setup_method(self):
+        nodes = [
+            ("Header", [("Q1", Delimeter("?::"), "A1"), ("Q2", Delimeter("?::"), "A2")]),
+            ("Header", [("Q3", Delimeter("?::"), "A3")]),
+        ]
+
+        self.cards = NodeParser().parse(nodes)
+
+    def test_same_path_object(self):
+        assert 1 == len({id(card.path) for card in self.cards})
+
+    def test_immutable(self):
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            self.cards[0].path = ("Other",)
+
+
+class TestCardTypes:
+    def test_list_path(self):
+        card = BasicCard("Q", "A", ["Header"])
+
+        assert ("Header",) == card.path
+        assert BasicCard("Q", "A", ("Header",)) == card
+
+    def test_pickle(self):
+        card = ClozeCard("{{c1::A}}", ("Header",), id="a", source="a.md")
+
+        assert card == pickle.loads(pickle.dumps(card))
+        assert "a.md" == pickle.loads(pickle.dumps(card)).source
+
+    def test_nodes_are_tuples(self):
+        assert ("Q", Delimeter("?::"), "A") == BasicNode("Q", Delimeter("?::"), "A")
+        assert ("Header", []) == PathNode("Header", [])
+
+
+class TestDeepNesting:
+    def test_parses_5k_nested_headers(self):
+        nodes = [("Q", Delimeter("?::"), "A")]
+
+        for i in reversed(range(5_000)):
+            nodes = [("Header {}".format(i), nodes)]
+
+        cards = NodeParser().parse(nodes)
+
+        assert 1 == len(cards)
+        assert tuple("Header {}".format(i) for i in range(5_000)) == cards[0].path
+
+    def test_parses_20k_siblings_in_order(self):
+        nodes = [
+            ("Header {}".format(i), [("Q{}".format(i), Delimeter("?::"), "A")])
+            for i in range(20_000)
+        ]
+
+        cards = NodeParser().parse(nodes)
+
+        assert ["Q{}".format(i) for i in range(20_000)] == [
+            card.question for card in cards
+        ]
+        assert ("Header 19999",) == cards[-1].path
@@ -0,0 +1,79 @@
+import pathlib
+
+import pytest
+
+from ankivalenz.markdown_parser import MarkdownParser, markdown_it
+from ankivalenz.parsers import HtmlFileParser, create_parser, file_format
+from ankivalenz.timings import Timings
+from ankivalenz.types import Delimeter
+
+MARKDOWN = """# Chemistry
+
+- Covalent bond ?:: Two atoms share electrons
+- ![Atom](images/atom.png)
+  - Nucleus ?:: Protons and neutrons
+"""
+
+HTML_DOCUMENT = """<!DOCTYPE html>
+<html>
+<head>
+<title>Notes ?:: Title</title>
+<style>a::before { content: "x"; }</style>
+<script>var a = "b ?:: c";</script>
+</head>
+<body>
+{}
+</body>
+</html>
+"""
+
+
+class TestFileFormat:
+    @pytest.mark.parametrize(
+        "path,expected",
+        [
+            ("a.md", "markdown"),
+            ("a/b.html", "html"),
+            (pathlib.Path("a.HTM"), "html"),
+            ("a.markdown", "markdown"),
+            ("a.txt", "markdown"),
+        ],
+    )
+    def test_file_format(self, path, expected):
+        assert expected == file_format(path)
+
+
+class TestCreateParser:
+    def test_markdown(self):
+        assert isinstance(create_parser("markdown"), MarkdownParser)
+
+    def test_html(self):
+        assert isinstance(
+            create_parser("html", {"parser": "tokens", "html_backend": "lxml"}),
+            HtmlFileParser,
+        )
+
+
+class TestHtmlFileParser:
+    @pytest.mark.parametrize("backend", ["html.parser", "lxml", "html5lib"])
+    def test_same_as_markdown(self, backend):
+        html = markdown_it().render(MARKDOWN)
+
+        assert MarkdownParser(html_backend=backend).parse(MARKDOWN) == HtmlFileParser(
+            html_backend=backend
+        ).parse(HTML_DOCUMENT.replace("{}", html))
+
+    def test_delimiters(self):
+        (nodes, _) = HtmlFileParser(delimiters={"front_back": "=>"}).parse(
+            "<ul><li>A => B</li></ul>"
+        )
+
+        assert [("A", Delimeter("?::"), "B")] == nodes
+
+    def test_timings(self):
+        timings = Timings()
+
+        HtmlFileParser(timings=timings).parse("<p>A ?:: B</p>")
+
+        assert "html" in timings.stages
+        assert 1 == len(timings.parse_times)
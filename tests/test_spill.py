@@ -0,0 +1,149 @@
+import os
+import tracemalloc
+
+from ankivalenz import spill
+from ankivalenz.anki_models import BASIC_MODEL
+from ankivalenz.generator import Note, card_guid
+from ankivalenz.manifest import MANIFEST_PATH, Manifest
+from ankivalenz.spill import CardStore, SpilledManifest
+from ankivalenz.types import BasicCard, ClozeCard
+
+CARDS = [
+    BasicCard("Q1", "A1", ("A", "B"), source="a.md"),
+    BasicCard("Q2", "A2", ("A", "B"), reverse=True, id="q2"),
+    ClozeCard("{{c1::C}}", (), source="a.md"),
+    BasicCard("Q1", "A1", ("A", "B"), source="a.md"),
+]
+
+GUIDS = ["a", "b", "c", "a"]
+
+
+class TestCardStore:
+    def test_round_trip(self):
+        with CardStore() as store:
+            store.add(zip(CARDS, GUIDS))
+
+            assert 4 == len(store)
+            assert [
+                (CARDS[0], "a", 0),
+                (CARDS[1], "b", 0),
+                (CARDS[2], "c", 0),
+                (CARDS[3], "a", 1),
+            ] == list(store)
+
+    def test_card_fields(self):
+        with CardStore() as store:
+            store.add(zip(CARDS, GUIDS))
+            cards = [card for (card, _, _) in store]
+
+        assert [("a.md", None), (None, "q2"), ("a.md", None), ("a.md", None)] == [
+            (card.source, card.id) for card in cards
+        ]
+        assert [False, True] == [card.reverse for card in cards[:2]]
+
+    def test_shares_paths(self):
+        with CardStore() as store:
+            store.add(zip(CARDS, GUIDS))
+            cards = [card for (card, _, _) in store]
+
+        assert cards[0].path is cards[1].path
+
+    def test_iterates_more_than_once(self):
+        with CardStore() as store:
+            store.add(zip(CARDS, GUIDS))
+            store.add([(CARDS[0], "a")])
+
+            assert list(store)[:4] == list(store)[:4]
+            assert (CARDS[0], "a", 2) == list(store)[4]
+
+    def test_close_removes_file(self):
+        store = CardStore()
+        store.close()
+
+        assert not os.path.exists(store.path)
+
+
+def note(guid, answer):
+    return Note(model=BASIC_MODEL, fields=["Q", answer, ""], guid=guid)
+
+
+def add_notes(manifest):
+    manifest.add(note("same", "A"), "a.md")
+    manifest.add(note("changed", "B"), "a.md")
+    manifest.add(note("added", "A"), "a.md")
+
+
+class TestSpilledManifest:
+    def test_same_as_manifest(self, tmp_path, monkeypatch):
+        # Flush the notes to the database more than once.
+        monkeypatch.setattr(spill, "BATCH_SIZE", 2)
+
+        previous = Manifest()
+        previous.add(note("same", "A"), "a.md")
+        previous.add(note("changed", "A"), "a.md")
+        previous.add(note("removed", "A"), "b.md")
+        previous.save(tmp_path)
+
+        manifest = Manifest()
+        add_notes(manifest)
+
+        with CardStore() as store:
+            spilled = SpilledManifest(store)
+            add_notes(spilled)
+            (added, changed, removed) = spilled.compare(tmp_path)
+
+            assert manifest.compare(tmp_path) == (list(added), list(changed), removed)
+            assert (1, 1) == (len(added), len(changed))
+
+    def test_missing_manifest(self, tmp_path):
+        with CardStore() as store:
+            spilled = SpilledManifest(store)
+            add_notes(spilled)
+            (added, changed, removed) = spilled.compare(tmp_path)
+
+            assert ["same", "changed", "added"] == list(added)
+            assert ([], {}) == (list(changed), removed)
+
+    def test_save(self, tmp_path):
+        manifest = Manifest()
+        add_notes(manifest)
+        manifest.save(tmp_path)
+        expected = (tmp_path / MANIFEST_PATH).read_bytes()
+
+        with CardStore() as store:
+            spilled = SpilledManifest(store)
+            add_notes(spilled)
+            spilled.save(tmp_path)
+
+        assert expected == (tmp_path / MANIFEST_PATH).read_bytes()
+
+
+# The Python memory allocated while adding `count` notes and cards to a store
+# and its manifest, and reading the cards back, in bytes.
+def traced_growth(count):
+    cards = (BasicCard("Q{}".format(idx), "A", ("Path",)) for idx in range(count))
+    tracemalloc.start()
+
+    try:
+        with CardStore() as store:
+            manifest = SpilledManifest(store)
+            store.add((card, card_guid(card)) for card in cards)
+
+            for card, guid, _ in store:
+                manifest.add(note(guid, card.answer), card.source)
+
+            return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+class TestMemory:
+    # The cards and notes are kept in the database, so only a batch of them is
+    # held in memory at a time, while a `Manifest` of 5,000 notes alone takes
+    # about 2 MiB. `benchmarks/memory.py` measures a full build.
+    def test_nothing_per_note_in_memory(self):
+        # The first batch also allocates caches, e.g. of the SQL statements
+        # and of freed tuples.
+        traced_growth(1_000)
+
+        assert traced_growth(5_000) < 512 * 1024
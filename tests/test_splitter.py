@@ -0,0 +1,63 @@
+from ankivalenz.splitter import split_text
+
+TEXT = """Intro
+
+# Chapter 1
+
+Q1 ?:: A1
+
+## Section 1.1
+
+Q2 ?:: A2
+
+## Section 1.2
+
+Q3 ?:: A3
+
+# Chapter 2
+
+Q4 ?:: A4
+"""
+
+
+class TestSplitText:
+    def test_small_text(self):
+        assert [("", TEXT)] == split_text(TEXT, len(TEXT))
+
+    def test_splits_at_headings(self):
+        assert [
+            ("", "Intro\n\n"),
+            ("", "# Chapter 1\n\nQ1 ?:: A1\n\n"),
+            ("# Chapter 1\n", "## Section 1.1\n\nQ2 ?:: A2\n\n"),
+            ("# Chapter 1\n", "## Section 1.2\n\nQ3 ?:: A3\n\n"),
+            ("", "# Chapter 2\n\nQ4 ?:: A4\n"),
+        ] == split_text(TEXT, 1)
+
+    def test_parts_of_at_least_size(self):
+        assert [
+            ("", "Intro\n\n# Chapter 1\n\nQ1 ?:: A1\n\n"),
+            (
+                "# Chapter 1\n",
+                "## Section 1.1\n\nQ2 ?:: A2\n\n## Section 1.2\n\nQ3 ?:: A3\n\n",
+            ),
+            ("", "# Chapter 2\n\nQ4 ?:: A4\n"),
+        ] == split_text(TEXT, 30)
+
+    def test_not_in_code_or_math(self):
+        text = "# A\n\n```\n# Code\n```\n\n$$\n# Math\n$$\n\n## B\n"
+
+        assert [
+            ("", "# A\n\n```\n# Code\n```\n\n$$\n# Math\n$$\n\n"),
+            ("# A\n", "## B\n"),
+        ] == split_text(text, 1)
+
+    def test_unsplittable(self):
+        for text in [
+            "# A\n\n[link]: https://example.com\n\n# B\n",
+            "# A\n\n<div>\n\n# B\n\n</div>\n",
+            "# A\n\n<h1>B</h1>\n\n# C\n",
+            "# A\n\nB\n===\n\n# C\n",
+            "# A\n\n  # B\n\n# C\n",
+            "# A\n\n- B\n$$\nC\n$$\n\n# D\n",
+        ]:
+            assert [("", text)] == split_text(text, 1)
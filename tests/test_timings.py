@@ -0,0 +1,71 @@
+import pathlib
+
+from ankivalenz.generator import load_cards, package
+from ankivalenz.timings import Timings
+
+
+class TestTimings:
+    def test_stage(self):
+        timings = Timings()
+
+        with timings.stage("a"):
+            pass
+        with timings.stage("a"):
+            pass
+
+        assert ["a"] == list(timings.stages)
+        assert timings.stages["a"] >= 0
+
+    def test_merge(self):
+        a = Timings()
+        a.add_time("parse", 1.0)
+        a.count("cards", 2)
+        a.files["a.md"] = 1.0
+
+        b = Timings()
+        b.add_time("parse", 2.0)
+        b.count("cards", 3)
+        b.files["b.md"] = 2.0
+
+        a.merge(b)
+
+        assert {"parse": 3.0} == a.stages
+        assert {"cards": 5} == a.counts
+        assert [("b.md", 2.0)] == a.slowest_files(1)
+
+    def test_report(self):
+        timings = Timings()
+        timings.add_time("parse", 1.0)
+        timings.count("files", 1)
+        timings.files["a.md"] = 1.0
+
+        assert {
+            "stages": {"parse": 1.0},
+            "counts": {"files": 1},
+            "slowest_files": [{"path": "a.md", "seconds": 1.0}],
+        } == timings.report()
+
+
+class TestLoadCardsTimings:
+    def test_records_stages_and_files(self):
+        timings = Timings()
+        (cards, _) = load_cards(pathlib.Path("sample/Biology"), timings=timings)
+
+        assert {"glob", "read", "parse", "markdown", "html", "nodes"} <= set(
+            timings.stages
+        )
+        assert len(cards) == timings.counts["cards"]
+        assert {"Cell.md", "Chemistry.md", "Animals/Mouse.md"} <= set(timings.files)
+
+    def test_records_files_in_parallel(self):
+        timings = Timings()
+        load_cards(pathlib.Path("sample/Biology"), jobs=2, timings=timings)
+
+        assert timings.counts["files"] == len(timings.files)
+
+    def test_package(self):
+        timings = Timings()
+        apkg = package(pathlib.Path("sample/Biology"), timings=timings)
+
+        assert len(apkg.decks[0].notes) == timings.counts["notes"]
+        assert len(apkg.media_files) == timings.counts["media"]
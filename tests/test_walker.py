@@ -0,0 +1,148 @@
+import os
+import pathlib
+
+import pytest
+
+from ankivalenz import walker
+from ankivalenz.walker import Ignore, find_files
+
+
+def touch(path: pathlib.Path, *names: str) -> None:
+    for name in names:
+        (path / name).parent.mkdir(parents=True, exist_ok=True)
+        (path / name).write_text("")
+
+
+class TestIgnoreMatch:
+    @pytest.mark.parametrize(
+        "pattern,relative,is_dir,expected",
+        [
+            ("drafts", "drafts", True, True),
+            ("drafts", "a/b/drafts", True, True),
+            ("drafts", "drafts.md", False, False),
+            ("drafts/", "drafts", False, False),
+            ("drafts/", "a/drafts", True, True),
+            ("/drafts", "a/drafts", True, False),
+            ("a/drafts", "a/drafts", True, True),
+            ("a/drafts", "b/a/drafts", True, False),
+            ("*.tmp.md", "a/b.tmp.md", False, True),
+            ("a/*.md", "a/b/c.md", False, False),
+            ("**/drafts", "a/b/drafts", True, True),
+            ("**/drafts", "drafts", True, True),
+            ("a/**/b", "a/b", True, True),
+            ("a/**/b", "a/x/y/b", True, True),
+            ("a/**", "a/x/y", False, True),
+            ("a/**", "a", True, False),
+            ("note?.md", "note1.md", False, True),
+            ("note?.md", "note10.md", False, False),
+            ("note[0-9].md", "note1.md", False, True),
+            ("note[!0-9].md", "note1.md", False, False),
+            ("\\#note.md", "#note.md", False, True),
+            ("# comment", "# comment", False, False),
+            ("", "", False, False),
+        ],
+    )
+    def test_match(self, pattern, relative, is_dir, expected):
+        assert expected == Ignore(pathlib.Path("."), [pattern]).match(relative, is_dir)
+
+    def test_last_match_wins(self):
+        ignore = Ignore(pathlib.Path("."), ["*.md", "!keep.md"])
+
+        assert ignore.match("notes.md", False)
+        assert not ignore.match("keep.md", False)
+
+    def test_ignored_folder(self):
+        ignore = Ignore(pathlib.Path("vault"), ["drafts/", "!drafts/keep.md"])
+
+        assert ignore.ignored(pathlib.Path("vault/drafts/keep.md"))
+        assert not ignore.ignored(pathlib.Path("vault/notes/keep.md"))
+
+
+class TestIgnoreLoad:
+    def test_ignore_file_and_exclude(self, tmp_path):
+        (tmp_path / ".ankivalenzignore").write_text("# Drafts\ndrafts/\n\n*.tmp\n")
+
+        ignore = Ignore.load(tmp_path, ["!keep.tmp", "archive"])
+
+        assert ignore.match("drafts", True)
+        assert ignore.match("a.tmp", False)
+        assert not ignore.match("keep.tmp", False)
+        assert ignore.match("archive", True)
+
+    def test_no_ignore_file(self, tmp_path):
+        assert [] == Ignore.load(tmp_path).patterns
+
+
+class TestFindFiles:
+    def test_same_as_glob(self):
+        path = pathlib.Path("sample")
+
+        assert sorted(path.glob("**/*.md")) == find_files(path, ["md"])
+
+    def test_extensions(self, tmp_path):
+        touch(tmp_path, "a.md", "b/c.markdown", "b/d.txt", "e.md/f.txt")
+
+        assert [tmp_path / "a.md", tmp_path / "b/c.markdown"] == find_files(
+            tmp_path, ["md", "markdown"]
+        )
+
+    def test_ignore(self, tmp_path):
+        touch(
+            tmp_path,
+            "notes/a.md",
+            "notes/drafts/b.md",
+            "notes/c.tmp.md",
+            "node_modules/d.md",
+        )
+        ignore = Ignore(tmp_path, ["drafts/", "*.tmp.md", "/node_modules"])
+
+        assert [tmp_path / "notes/a.md"] == find_files(tmp_path, ["md"], ignore)
+
+    def test_relative_to_root(self, tmp_path):
+        touch(tmp_path, "notes/drafts/a.md", "notes/b.md")
+        ignore = Ignore(tmp_path, ["/notes/drafts"])
+
+        assert [tmp_path / "notes/b.md"] == find_files(
+            tmp_path / "notes", ["md"], ignore
+        )
+
+    def test_prunes_ignored_folders(self, tmp_path, monkeypatch):
+        touch(tmp_path, "a.md", "drafts/b.md", "drafts/c/d.md")
+        scanned = []
+        scandir = os.scandir
+
+        def recording_scandir(path):
+            scanned.append(pathlib.Path(path))
+            return scandir(path)
+
+        monkeypatch.setattr(walker.os, "scandir", recording_scandir)
+
+        find_files(tmp_path, ["md"], Ignore(tmp_path, ["drafts/"]))
+
+        assert [tmp_path] == scanned
+
+    @pytest.mark.parametrize("ignore", [None, ["drafts/"]])
+    def test_skips_state_folder(self, tmp_path, monkeypatch, ignore):
+        touch(tmp_path, "a.md", ".ankivalenz/manifest.jsonl", ".ankivalenz/cache/b.md")
+        scanned = []
+        scandir = os.scandir
+
+        def recording_scandir(path):
+            scanned.append(pathlib.Path(path))
+            return scandir(path)
+
+        monkeypatch.setattr(walker.os, "scandir", recording_scandir)
+
+        assert [tmp_path / "a.md"] == find_files(
+            tmp_path, ["md"], None if ignore is None else Ignore(tmp_path, ignore)
+        )
+        assert [tmp_path] == scanned
+
+    def test_does_not_follow_symlinked_folders(self, tmp_path):
+        touch(tmp_path, "notes/a.md")
+        (tmp_path / "link").symlink_to(tmp_path / "notes")
+
+        assert [tmp_path / "notes/a.md"] == find_files(tmp_path, ["md"])
+
+    def test_missing_path(self, tmp_path):
+        assert [] == find_files(tmp_path / "missing", ["md"])
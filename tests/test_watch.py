@@ -0,0 +1,80 @@
+import os
+
+from ankivalenz.walker import Ignore
+from ankivalenz.watch import (
+    FileWatcher,
+    PollingWatcher,
+    changed_paths,
+    wait_for_changes,
+)
+
+
+class FakeWatcher:
+    def __init__(self, polls):
+        self.polls = polls
+
+    def poll(self):
+        return self.polls.pop(0) if self.polls else set()
+
+
+class TestChangedPaths:
+    def test_changed_paths(self):
+        old = {"a": (1, 1), "b": (1, 1), "c": (1, 1)}
+        new = {"a": (1, 1), "b": (2, 1), "d": (1, 1)}
+
+        assert {"b", "c", "d"} == changed_paths(old, new)
+
+
+class TestPollingWatcher:
+    def test_finds_changes(self, tmp_path):
+        note = tmp_path / "note.md"
+        note.write_text("- A :: B")
+        watcher = PollingWatcher(tmp_path, ["md"])
+
+        assert set() == watcher.poll()
+
+        note.write_text("- A :: C")
+        os.utime(note, ns=(0, 0))
+        (tmp_path / "image.png").write_bytes(b"")
+        (tmp_path / "ignored.txt").write_text("")
+
+        assert {note} == watcher.poll()
+
+    def test_ignores_files(self, tmp_path):
+        (tmp_path / "drafts").mkdir()
+        watcher = PollingWatcher(tmp_path, ["md"], Ignore(tmp_path, ["drafts/"]))
+        note = tmp_path / "note.md"
+        note.write_text("- A :: B")
+        (tmp_path / "drafts" / "draft.md").write_text("- A :: B")
+
+        assert {note} == watcher.poll()
+
+
+class TestWaitForChanges:
+    def test_debounces_bursts(self):
+        watcher = FakeWatcher([set(), {"a"}, set(), {"b"}, set(), set(), {"c"}])
+
+        changes = wait_for_changes(
+            watcher, interval=1, debounce=2, sleep=lambda seconds: None
+        )
+
+        assert {"a", "b"} == changes
+        assert [{"c"}] == watcher.polls
+
+
+class TestFileWatcher:
+    def test_finds_changes(self, tmp_path):
+        settings = tmp_path / "ankivalenz.json"
+        settings.write_text("{}")
+        ignore = tmp_path / ".ankivalenzignore"
+        watcher = FileWatcher([settings, ignore])
+
+        assert set() == watcher.poll()
+
+        ignore.write_text("drafts/")
+
+        assert {ignore} == watcher.poll()
+
+        settings.unlink()
+
+        assert {settings} == watcher.poll()